@@ -1,145 +1,3578 @@
 # --- START OF FILE weather_app_modern_v5.py ---
 
+import argparse
+import asyncio
 import threading
 import requests
-from flask import Flask, request, jsonify
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ReadTimeoutError
+from urllib3.util.retry import Retry
+from flask import Flask, Response, g, request, jsonify
+from werkzeug.serving import make_server
 import datetime
-import tkinter as tk
-from tkinter import ttk  # Import themed widgets for Progressbar
-import tkinter.font as tkfont  # Import tkinter.font for font operations
-from PIL import Image, ImageTk, ImageOps, ImageDraw, ImageFont
+import gzip
+import hashlib
+import heapq
 import io
+import json
+import math
+import mmap
+import queue
+import re
+import signal
+import socket
+import sqlite3
+import struct
+import tempfile
 import time
 import sys
 import os
+import bisect
+import unicodedata
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+
+# Modul GUI (tkinter, PIL) di-import lazily lewat load_gui_modules(),
+# supaya mode API-only tidak pernah memuat stack GUI.
+tk = None
+ttk = None     # Themed widgets untuk Progressbar
+tkfont = None  # tkinter.font untuk operasi font
+Image = None
+ImageTk = None
+
+
+def load_gui_modules():
+    """Import tkinter dan PIL (sekali saja); dipanggil sebelum membuat GUI."""
+    global tk, ttk, tkfont, Image, ImageTk
+    if tk is not None:
+        return
+    import tkinter
+    import tkinter.ttk
+    import tkinter.font
+    from PIL import Image as pil_image, ImageTk as pil_image_tk
+    tk, ttk, tkfont = tkinter, tkinter.ttk, tkinter.font
+    Image, ImageTk = pil_image, pil_image_tk
+
 
 # --- KONSTANTA & KONFIGURASI UMUM (Tidak Bergantung Tkinter Root) ---
 # Gunakan Environment Variable untuk API Key (RECOMMENDED)
 # Pastikan environment variable OPENWEATHERMAP_API_KEY diset di terminal sebelum menjalankan script.
 API_KEY = os.environ.get("OPENWEATHERMAP_API_KEY")
 
-# OPSI: Jika kesulitan dengan environment variable, bisa gunakan API Key langsung di sini untuk DEMO CEPAT.
-# HAPUS ATAU KOMEN BARIS DI ATAS (API_KEY = os.environ.get(...)), dan UN-KOMEN BARIS DI BAWAH ini:
-# API_KEY = "92c86ac6896ca566aa3b2e2dd154e7c6"  # <-- PASTE API KEY KAMU DI SINI (Jika pakai opsi langsung)
+# OPSI: Jika kesulitan dengan environment variable, bisa gunakan API Key langsung di sini untuk DEMO CEPAT.
+# HAPUS ATAU KOMEN BARIS DI ATAS (API_KEY = os.environ.get(...)), dan UN-KOMEN BARIS DI BAWAH ini:
+# API_KEY = "92c86ac6896ca566aa3b2e2dd154e7c6"  # <-- PASTE API KEY KAMU DI SINI (Jika pakai opsi langsung)
+
+
+# Jika tidak ada API Key dari environment (dan tidak pakai opsi langsung), tampilkan pesan error dan keluar
+if not API_KEY:
+    print("Error: OPENWEATHERMAP_API_KEY environment variable not set.")
+    print("Please set it before running the script.")
+    print("Example (Linux/macOS): export OPENWEATHERMAP_API_KEY='your_api_key'")
+    print("Example (Windows Command Prompt): set OPENWEATHERMAP_API_KEY=your_api_key")
+    print("Example (Windows PowerShell): $env:OPENWEATHERMAP_API_KEY='your_api_key'")
+    sys.exit(1)  # Keluar dari program jika API Key tidak ada
+
+
+# Alamat server API lokal
+API_HOST = os.environ.get("WEATHER_API_HOST", "127.0.0.1")
+API_PORT = int(os.environ.get("WEATHER_API_PORT", 5000))
+
+# Pengaturan URL API OpenWeatherMap
+BASE_OWM_API_URL = os.environ.get("OWM_API_URL", "http://api.openweathermap.org/data/2.5/")
+BASE_OWM_ICON_URL = os.environ.get("OWM_ICON_URL", "http://openweathermap.org/img/wn/")
+
+# Pengaturan HTTP client upstream (pool koneksi, timeout, retry)
+UPSTREAM_POOL_CONNECTIONS = int(os.environ.get("OWM_POOL_CONNECTIONS", 4))   # jumlah host yang pool-nya disimpan
+UPSTREAM_POOL_MAXSIZE = int(os.environ.get("OWM_POOL_MAXSIZE", 16))          # maks koneksi per host
+UPSTREAM_CONNECT_TIMEOUT = float(os.environ.get("OWM_CONNECT_TIMEOUT", 3.05))
+UPSTREAM_READ_TIMEOUT = float(os.environ.get("OWM_READ_TIMEOUT", 10))
+UPSTREAM_MAX_RETRIES = int(os.environ.get("OWM_MAX_RETRIES", 2))
+UPSTREAM_BACKOFF_FACTOR = float(os.environ.get("OWM_BACKOFF_FACTOR", 0.3))
+UPSTREAM_BACKOFF_JITTER = float(os.environ.get("OWM_BACKOFF_JITTER", 0.3))
+
+# Pengaturan cache respons cuaca (detik / jumlah entri), bisa diubah lewat environment variable
+CACHE_TTL_SECONDS = float(os.environ.get("WEATHER_CACHE_TTL", 600))
+CACHE_MAX_STALE_SECONDS = float(os.environ.get("WEATHER_CACHE_MAX_STALE", 3600))
+CACHE_MAX_ENTRIES = int(os.environ.get("WEATHER_CACHE_MAX_ENTRIES", 1024))
+
+# Indeks nama kota offline (autocomplete, normalisasi) dan cache negatif untuk kota yang 404 di OWM
+CITY_INDEX_PATH = os.environ.get("WEATHER_CITY_INDEX_PATH",
+                                 os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "cities.tsv"))
+CITY_INDEX_STRICT = os.environ.get("WEATHER_CITY_INDEX_STRICT", "0") == "1"  # tolak kota di luar indeks tanpa ke OWM
+NEGATIVE_CACHE_TTL = float(os.environ.get("WEATHER_NEGATIVE_CACHE_TTL", 3600))
+NEGATIVE_CACHE_MAX_ENTRIES = int(os.environ.get("WEATHER_NEGATIVE_CACHE_MAX_ENTRIES", 10000))
+
+# Penyimpanan observasi di disk (SQLite WAL) untuk warm restart dan /weather/history.
+# Set WEATHER_STORE_PATH="" untuk mematikan.
+STORE_PATH = os.environ.get("WEATHER_STORE_PATH",
+                            os.path.join(os.path.expanduser("~"), ".cache", "weather_app", "observations.sqlite3"))
+STORE_RETENTION_DAYS = float(os.environ.get("WEATHER_STORE_RETENTION_DAYS", 30))
+STORE_BATCH_SIZE = int(os.environ.get("WEATHER_STORE_BATCH_SIZE", 200))
+STORE_FLUSH_INTERVAL = float(os.environ.get("WEATHER_STORE_FLUSH_INTERVAL", 1.0))
+
+# Scheduler refresh proaktif untuk kota populer (hot set / watchlist)
+REFRESH_ENABLED = os.environ.get("WEATHER_REFRESH_ENABLED", "1") == "1"
+REFRESH_WATCHLIST = [city.strip() for city in os.environ.get("WEATHER_REFRESH_WATCHLIST", "").split(",") if city.strip()]
+REFRESH_HOT_SIZE = int(os.environ.get("WEATHER_REFRESH_HOT_SIZE", 50))
+REFRESH_LEAD_SECONDS = float(os.environ.get("WEATHER_REFRESH_LEAD", 60))     # refresh sekian detik sebelum TTL habis
+OWM_QUOTA_PER_MINUTE = int(os.environ.get("OWM_QUOTA_PER_MINUTE", 60))        # kuota paket OWM (total panggilan/menit)
+
+# Admission control upstream: token bucket + antrean prioritas (OWM_RATE_LIMIT=0 untuk mematikan)
+UPSTREAM_RATE_LIMIT = float(os.environ.get("OWM_RATE_LIMIT", OWM_QUOTA_PER_MINUTE / 60.0))  # token per detik
+UPSTREAM_RATE_BURST = int(os.environ.get("OWM_RATE_BURST", 20))
+UPSTREAM_QUEUE_SIZE = int(os.environ.get("OWM_RATE_QUEUE_SIZE", 100))
+UPSTREAM_QUEUE_MAX_WAIT = float(os.environ.get("OWM_RATE_QUEUE_MAX_WAIT", 5))  # detik; lebih lama -> 503
+# Batch/refresh background boleh antre lebih lama daripada lookup interaktif sebelum ditolak
+UPSTREAM_QUEUE_MAX_WAIT_BATCH = float(os.environ.get("OWM_RATE_QUEUE_MAX_WAIT_BATCH", 60))
+
+# Hedged request upstream (OWM_HEDGE=1): percobaan kedua jika yang pertama belum menjawab setelah
+# delay = persentil latensi terakhir; circuit breaker (OWM_BREAKER_FAILURES=0 untuk mematikan)
+UPSTREAM_HEDGE_ENABLED = os.environ.get("OWM_HEDGE", "0") == "1"
+UPSTREAM_HEDGE_PERCENTILE = float(os.environ.get("OWM_HEDGE_PERCENTILE", 95))
+UPSTREAM_HEDGE_MIN_DELAY = float(os.environ.get("OWM_HEDGE_MIN_DELAY", 0.05))
+UPSTREAM_HEDGE_INITIAL_DELAY = float(os.environ.get("OWM_HEDGE_INITIAL_DELAY", 1.0))  # sebelum ada cukup sampel
+UPSTREAM_BREAKER_FAILURES = int(os.environ.get("OWM_BREAKER_FAILURES", 5))
+UPSTREAM_BREAKER_RESET = float(os.environ.get("OWM_BREAKER_RESET", 30))  # detik open sebelum probe half-open
+
+# Prioritas panggilan upstream (angka kecil = didahulukan)
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+PRIORITY_BACKGROUND = 2
+
+# Respons pre-serialized: varian gzip untuk body minimal sekian byte (WEATHER_GZIP=0 untuk mematikan)
+GZIP_ENABLED = os.environ.get("WEATHER_GZIP", "1") == "1"
+GZIP_MIN_BYTES = int(os.environ.get("WEATHER_GZIP_MIN_BYTES", 200))
+
+# Lookup koordinat (/weather?lat=&lon=): koordinat dibulatkan ke grid (derajat) sebelum cache & upstream
+GEO_GRID_DEGREES = max(0.0, float(os.environ.get("WEATHER_GEO_GRID", 0.05)))  # 0 = tanpa snapping
+
+# Pengaturan endpoint batch (/weather/batch)
+BATCH_MAX_CITIES = int(os.environ.get("WEATHER_BATCH_MAX_CITIES", 500))
+BATCH_MAX_WORKERS = int(os.environ.get("WEATHER_BATCH_WORKERS", 16))
+
+# Streaming update cuaca (/weather/stream, SSE atau NDJSON)
+STREAM_MAX_CLIENTS = int(os.environ.get("WEATHER_STREAM_MAX_CLIENTS", 200))
+STREAM_KEEPALIVE_SECONDS = float(os.environ.get("WEATHER_STREAM_KEEPALIVE", 15))
+STREAM_POLL_INTERVAL = float(os.environ.get("WEATHER_STREAM_POLL_INTERVAL", 5))  # cek cache untuk kota yang di-subscribe
+
+# Pengaturan mode serving asyncio (--async-api)
+ASYNC_MAX_CONCURRENCY = int(os.environ.get("WEATHER_ASYNC_MAX_CONCURRENCY", 1000))
+ASYNC_MAX_WAITING = int(os.environ.get("WEATHER_ASYNC_MAX_WAITING", 5000))
+ASYNC_UPSTREAM_CONNECTIONS = int(os.environ.get("WEATHER_ASYNC_UPSTREAM_CONNECTIONS", 100))
+
+# Mode production multi-proses (--workers N): worker pre-fork berbagi satu port dan satu cache
+# di file memory-mapped (WEATHER_SHARED_CACHE_PATH kosong = file sementara)
+WORKERS = int(os.environ.get("WEATHER_WORKERS", os.cpu_count() or 1))
+SHARED_CACHE_PATH = os.environ.get("WEATHER_SHARED_CACHE_PATH", "")
+SHARED_CACHE_SLOTS = int(os.environ.get("WEATHER_SHARED_CACHE_SLOTS", 4096))
+SHARED_CACHE_SLOT_BYTES = int(os.environ.get("WEATHER_SHARED_CACHE_SLOT_BYTES", 2048))
+SHARED_FETCH_LEASE = float(os.environ.get("WEATHER_SHARED_FETCH_LEASE", 15))  # detik; batas tunggu fetch worker lain
+WORKER_SHUTDOWN_TIMEOUT = float(os.environ.get("WEATHER_WORKER_SHUTDOWN_TIMEOUT", 30))
+
+# Sumber data GUI: "inprocess" (panggil cache/fetch langsung) atau "remote" (HTTP ke server API)
+GUI_DATA_SOURCE = os.environ.get("WEATHER_GUI_SOURCE", "inprocess")
+WEATHER_API_URL = os.environ.get("WEATHER_API_URL", "http://127.0.0.1:5000")
+
+# Fetch GUI: worker pool kecil (latest-wins) dan pencarian otomatis saat mengetik (debounce, ms)
+GUI_FETCH_WORKERS = int(os.environ.get("WEATHER_GUI_FETCH_WORKERS", 2))
+GUI_SEARCH_AS_YOU_TYPE = os.environ.get("WEATHER_GUI_SEARCH_AS_YOU_TYPE", "0") == "1"
+GUI_SEARCH_DEBOUNCE_MS = int(os.environ.get("WEATHER_GUI_SEARCH_DEBOUNCE_MS", 400))
+
+# Pengaturan cache ikon cuaca GUI (memori + disk)
+ICON_SIZE = (100, 100)
+ICON_CACHE_DIR = os.environ.get("WEATHER_ICON_CACHE_DIR",
+                                os.path.join(os.path.expanduser("~"), ".cache", "weather_app", "icons"))
+ICON_PREFETCH = os.environ.get("WEATHER_ICON_PREFETCH", "1") == "1"
+# Dasbor multi-kota (--dashboard): daftar kota default dan interval flush update ke widget (ms)
+DASHBOARD_CITIES = [city.strip() for city in os.environ.get("WEATHER_DASHBOARD_CITIES", "").split(";") if city.strip()]
+DASHBOARD_FRAME_MS = int(os.environ.get("WEATHER_DASHBOARD_FRAME_MS", 100))
+DASHBOARD_ICON_SIZE = (50, 50)
+# Kode ikon standar OWM (01d ... 50n)
+OWM_ICON_CODES = tuple(f"{num:02d}{part}" for num in (1, 2, 3, 4, 9, 10, 11, 13, 50) for part in "dn")
+# Format kode ikon yang boleh dipakai untuk nama file cache dan URL ikon
+ICON_ID_PATTERN = re.compile(r"[0-9]{2}[dn]")
+
+# --- Definisi Tema Warna (Modern & Menarik - Mengambil Inspirasi dari Gambar) ---
+THEME = {
+    "primary_bg": "#1a237e",       # Sangat gelap biru/ungu (latar belakang utama)
+    "secondary_bg": "#303f9f",     # Lebih terang biru/ungu (latar belakang container info cuaca)
+    "card_bg": "#3949ab",          # Medium biru/ungu (latar belakang kartu detail)
+    "text_primary": "#ffffff",     # Putih (teks utama, judul, label)
+    "text_secondary": "#bbdefb",   # Biru muda (deskripsi, beberapa label)
+    "accent_temp": "#ffeb3b",      # Kuning cerah (suhu utama)
+    "accent_detail_value": "#ffeb3b", # Kuning cerah (nilai detail)
+    "accent_icon": "#ffeb3b",      # Kuning cerah (ikon aplikasi, beberapa ikon detail)
+    "button_bg": "#ffca28",        # Kuning (latar belakang tombol)
+    "button_fg": "#1a237e",        # Warna teks tombol (sesuai primary_bg)
+    "entry_bg": "#e0e0e0",         # Abu-abu terang (latar belakang input)
+    "entry_fg": "#1a237e",         # Warna teks input (sesuai primary_bg)
+    "entry_insert": "gray",        # Warna kursor
+    "error_fg": "#ff8a65",         # Oranye terang (pesan error)
+    "footer_fg": "#e0e0e0",        # Abu-abu terang (teks footer)
+}
+
+
+# --- Metrics (Format Teks Prometheus) ---
+
+class Histogram:
+    """Histogram dengan bucket tetap (kumulatif saat di-render), thread-safe dan murah."""
+
+    DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)  # slot terakhir = +Inf
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def snapshot(self):
+        """Mengembalikan (list (le, count kumulatif), sum, count)."""
+        with self._lock:
+            counts = list(self._counts)
+            total_sum = self._sum
+        cumulative = []
+        running = 0
+        for le, count in zip(self.buckets + (float("inf"),), counts):
+            running += count
+            cumulative.append((le, running))
+        return cumulative, total_sum, running
+
+
+class Metrics:
+    """Latensi per tahap request path, counter status/error upstream, dan gauge in-flight."""
+
+    STAGES = ("upstream", "parse", "transform", "serialize")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stage_latency = {stage: Histogram() for stage in self.STAGES}
+        self.request_latency = {}   # endpoint -> Histogram
+        self.status_codes = {}      # status -> count
+        self.upstream_errors = {}   # jenis error -> count
+        self.in_flight = 0
+
+    def observe_stage(self, stage, seconds):
+        self.stage_latency[stage].observe(seconds)
+
+    @contextmanager
+    def time_stage(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_latency[stage].observe(time.perf_counter() - start)
+
+    def observe_request(self, endpoint, status, seconds):
+        with self._lock:
+            histogram = self.request_latency.get(endpoint)
+            if histogram is None:
+                histogram = self.request_latency[endpoint] = Histogram()
+            self.status_codes[status] = self.status_codes.get(status, 0) + 1
+        histogram.observe(seconds)
+
+    def count_upstream_error(self, kind):
+        with self._lock:
+            self.upstream_errors[kind] = self.upstream_errors.get(kind, 0) + 1
+
+    def request_started(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def request_finished(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    @staticmethod
+    def _render_histogram(lines, name, labels, histogram):
+        cumulative, total_sum, count = histogram.snapshot()
+        for le, bucket_count in cumulative:
+            le_text = "+Inf" if le == float("inf") else repr(le)
+            lines.append(f'{name}_bucket{{{labels},le="{le_text}"}} {bucket_count}')
+        lines.append(f"{name}_sum{{{labels}}} {total_sum}")
+        lines.append(f"{name}_count{{{labels}}} {count}")
+
+    def render(self, extra_stats=None):
+        """Render semua metric dalam format teks Prometheus (text/plain; version=0.0.4).
+
+        ``extra_stats`` berupa {section: {nama: angka}} (misalnya isi /stats),
+        di-export sebagai gauge ``weather_<section>_<nama>``.
+        """
+        lines = [
+            "# HELP weather_stage_duration_seconds Latency of each stage of the /weather request path.",
+            "# TYPE weather_stage_duration_seconds histogram",
+        ]
+        for stage, histogram in self.stage_latency.items():
+            self._render_histogram(lines, "weather_stage_duration_seconds", f'stage="{stage}"', histogram)
+
+        with self._lock:
+            request_latency = dict(self.request_latency)
+            status_codes = dict(self.status_codes)
+            upstream_errors = dict(self.upstream_errors)
+            in_flight = self.in_flight
+
+        lines.append("# HELP weather_request_duration_seconds Total HTTP request latency per endpoint.")
+        lines.append("# TYPE weather_request_duration_seconds histogram")
+        for endpoint, histogram in sorted(request_latency.items()):
+            self._render_histogram(lines, "weather_request_duration_seconds", f'endpoint="{endpoint}"', histogram)
+
+        lines.append("# HELP weather_http_responses_total HTTP responses by status code.")
+        lines.append("# TYPE weather_http_responses_total counter")
+        for status, count in sorted(status_codes.items()):
+            lines.append(f'weather_http_responses_total{{status="{status}"}} {count}')
+
+        lines.append("# HELP weather_upstream_errors_total Upstream (OWM) errors by type.")
+        lines.append("# TYPE weather_upstream_errors_total counter")
+        for kind, count in sorted(upstream_errors.items()):
+            lines.append(f'weather_upstream_errors_total{{type="{kind}"}} {count}')
+
+        lines.append("# HELP weather_http_in_flight_requests HTTP requests currently being served.")
+        lines.append("# TYPE weather_http_in_flight_requests gauge")
+        lines.append(f"weather_http_in_flight_requests {in_flight}")
+
+        for section, values in (extra_stats or {}).items():
+            for name, value in values.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                metric = f"weather_{section}_{name}"
+                lines.append(f"# HELP {metric} Nilai {section}.{name} dari /stats.")
+                lines.append(f"# TYPE {metric} gauge")
+                lines.append(f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+# --- HTTP Client Upstream (Pooled, Keep-Alive, Retry) ---
+
+class _CountingRetry(Retry):
+    """Retry urllib3 yang melaporkan setiap retry ke UpstreamClient pemiliknya."""
+    owner = None
+
+    def increment(self, *args, **kwargs):
+        new_retry = super().increment(*args, **kwargs)
+        if self.owner is not None:
+            self.owner._count_retry()
+        return new_retry
+
+
+class UpstreamClient:
+    """Session requests bersama untuk semua panggilan ke OpenWeatherMap.
+
+    Koneksi disimpan di pool (keep-alive) dengan batas koneksi per host,
+    timeout connect/read terpisah, dan retry backoff eksponensial + jitter
+    untuk respons 5xx. Read timeout tidak di-retry: satu panggilan lambat
+    tidak boleh menjadi beberapa kali ``read_timeout``.
+    """
+
+    # 429 tidak di-retry di sini: ditangani UpstreamRateLimiter (pause sesuai Retry-After)
+    RETRY_STATUSES = (500, 502, 503, 504)
+
+    def __init__(self, pool_connections=UPSTREAM_POOL_CONNECTIONS, pool_maxsize=UPSTREAM_POOL_MAXSIZE,
+                 connect_timeout=UPSTREAM_CONNECT_TIMEOUT, read_timeout=UPSTREAM_READ_TIMEOUT,
+                 max_retries=UPSTREAM_MAX_RETRIES, backoff_factor=UPSTREAM_BACKOFF_FACTOR,
+                 backoff_jitter=UPSTREAM_BACKOFF_JITTER):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+
+        retry_cls = type("_ClientRetry", (_CountingRetry,), {"owner": self})
+        retry_options = dict(
+            total=max_retries,
+            read=False,  # read timeout langsung di-raise sebagai ReadTimeout (bukan ConnectionError)
+            backoff_factor=backoff_factor,
+            status_forcelist=self.RETRY_STATUSES,
+            allowed_methods=frozenset(["GET"]),
+            respect_retry_after_header=True,
+            raise_on_status=False,  # biarkan raise_for_status() yang menentukan error
+        )
+        try:
+            retry = retry_cls(backoff_jitter=backoff_jitter, **retry_options)
+        except TypeError:
+            retry = retry_cls(**retry_options)  # urllib3 < 2: tanpa jitter
+        self._adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                                    pool_block=True, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", self._adapter)
+        self.session.mount("https://", self._adapter)
+
+    def _count_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def get(self, url, params=None, read_timeout=None):
+        with self._lock:
+            self.requests += 1
+        timeout = (self.connect_timeout, read_timeout if read_timeout is not None else self.read_timeout)
+        return self.session.get(url, params=params, timeout=timeout)
+
+    def stats(self):
+        """Counter request, retry, dan koneksi baru vs koneksi yang dipakai ulang."""
+        new_connections = 0
+        pool_requests = 0
+        pools = self._adapter.poolmanager.pools
+        for pool_key in list(pools.keys()):
+            pool = pools.get(pool_key)
+            if pool is None:
+                continue
+            new_connections += pool.num_connections
+            pool_requests += pool.num_requests
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "retries": self.retries,
+                "new_connections": new_connections,
+                "reused_connections": max(0, pool_requests - new_connections),
+            }
+
+
+upstream_client = UpstreamClient()
+
+
+# --- Admission Control Upstream (Token Bucket + Antrean Prioritas) ---
+
+class UpstreamBusy(Exception):
+    """Panggilan upstream ditolak limiter; ``retry_after`` dalam detik."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Upstream busy, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class UpstreamRateLimiter:
+    """Token bucket dengan antrean prioritas terbatas di depan panggilan ke OWM.
+
+    Jika token habis, pemanggil menunggu di antrean (prioritas kecil dilayani
+    lebih dulu). Jika antrean penuh, waiter berprioritas paling rendah digeser
+    keluar, atau pemanggil langsung ditolak dengan UpstreamBusy. Perkiraan
+    waktu tunggu lebih dari ``max_wait`` juga langsung ditolak (fail fast);
+    batch dan refresh background memakai ``max_wait_batch`` yang lebih longgar
+    karena tidak ada pengguna yang menunggu satu kota tertentu.
+    Respons 429 dari OWM menghentikan semua panggilan selama Retry-After.
+    """
+
+    class _Waiter:
+        __slots__ = ("priority", "seq", "state")
+
+        def __init__(self, priority, seq):
+            self.priority = priority
+            self.seq = seq
+            self.state = "waiting"
+
+        def __lt__(self, other):
+            return (self.priority, self.seq) < (other.priority, other.seq)
+
+    def __init__(self, rate=UPSTREAM_RATE_LIMIT, burst=UPSTREAM_RATE_BURST,
+                 max_queue=UPSTREAM_QUEUE_SIZE, max_wait=UPSTREAM_QUEUE_MAX_WAIT,
+                 max_wait_batch=UPSTREAM_QUEUE_MAX_WAIT_BATCH):
+        self.rate = rate
+        self.burst = burst
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.max_wait_batch = max(max_wait, max_wait_batch)
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._heap = []
+        self._waiting = 0
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._shared = None  # SharedWeatherCache berisi token bucket bersama (mode multi-proses)
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.evicted = 0
+        self.pauses = 0
+        self.calls = 0  # panggilan cuaca OWM yang lolos acquire (tanpa hedge), dipakai kuota scheduler
+
+    @property
+    def enabled(self):
+        return self.rate > 0
+
+    def share(self, shared):
+        """Pakai token bucket di cache bersama: kuota berlaku untuk semua worker pre-fork sekaligus."""
+        with self._cond:
+            self._shared = shared
+
+    def _refill(self, now, take=False):
+        """Isi ulang token; jika ``take``, ambil satu token bila tersedia (True jika berhasil)."""
+        if self._shared is not None:
+            taken, self._tokens, paused_for = self._shared.bucket_update(self.rate, self.burst, take)
+            self._paused_until = now + paused_for
+            return taken
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if take and self._tokens >= 1 and now >= self._paused_until:
+            self._tokens -= 1
+            return True
+        return False
+
+    def _estimated_wait(self, now, position):
+        """Perkiraan waktu tunggu untuk waiter di posisi ``position`` (0 = terdepan)."""
+        wait = max(0.0, (position + 1 - self._tokens) / self.rate)
+        return max(wait, self._paused_until - now)
+
+    def _retry_after(self, now):
+        return max(1, math.ceil(self._estimated_wait(now, self._waiting)))
+
+    def try_acquire(self, priority=PRIORITY_INTERACTIVE):
+        """Ambil token tanpa menunggu; False jika harus antre."""
+        if not self.enabled:
+            return True
+        with self._cond:
+            if self._refill(time.monotonic(), take=not self._waiting):
+                self.admitted += 1
+                return True
+            return False
+
+    def acquire(self, priority=PRIORITY_INTERACTIVE):
+        """Tunggu giliran sesuai prioritas; raise UpstreamBusy jika antrean penuh/terlalu lama."""
+        self._acquire(priority)
+        with self._cond:
+            self.calls += 1
+
+    def _acquire(self, priority):
+        if not self.enabled or self.try_acquire(priority):
+            return
+        with self._cond:
+            now = time.monotonic()
+            position = sum(1 for w in self._heap if w.state == "waiting" and w.priority <= priority)
+            max_wait = self.max_wait if priority <= PRIORITY_INTERACTIVE else self.max_wait_batch
+            if self._estimated_wait(now, position) > max_wait:
+                self.rejected += 1
+                raise UpstreamBusy(self._retry_after(now))
+            if self._waiting >= self.max_queue and not self._evict_lower(priority):
+                self.rejected += 1
+                raise UpstreamBusy(self._retry_after(now))
+
+            self._seq += 1
+            waiter = self._Waiter(priority, self._seq)
+            heapq.heappush(self._heap, waiter)
+            self._waiting += 1
+            self.queued += 1
+            deadline = now + max_wait
+            try:
+                while True:
+                    if waiter.state == "evicted":
+                        raise UpstreamBusy(self._retry_after(time.monotonic()))
+                    now = time.monotonic()
+                    self._drop_inactive_head()
+                    if self._refill(now, take=self._heap[0] is waiter):
+                        heapq.heappop(self._heap)
+                        waiter.state = "admitted"
+                        self.admitted += 1
+                        self._cond.notify_all()
+                        return
+                    if now >= deadline:
+                        self.rejected += 1
+                        raise UpstreamBusy(self._retry_after(now))
+                    wake_at = max(self._paused_until, now + max(0.0, (1 - self._tokens) / self.rate))
+                    self._cond.wait(min(deadline, wake_at) - now + 0.001)
+            finally:
+                # Waiter yang digeser keluar sudah dikurangi dari _waiting oleh _evict_lower
+                if waiter.state != "evicted":
+                    self._waiting -= 1
+                if waiter.state == "waiting":
+                    waiter.state = "cancelled"
+                self._cond.notify_all()
+
+    def _drop_inactive_head(self):
+        while self._heap and self._heap[0].state != "waiting":
+            heapq.heappop(self._heap)
+
+    def _evict_lower(self, priority):
+        """Geser keluar waiter berprioritas paling rendah (lebih rendah dari ``priority``)."""
+        candidates = [w for w in self._heap if w.state == "waiting" and w.priority > priority]
+        if not candidates:
+            return False
+        victim = max(candidates, key=lambda w: (w.priority, w.seq))
+        victim.state = "evicted"
+        self._waiting -= 1
+        self.evicted += 1
+        self._cond.notify_all()
+        return True
+
+    def pause(self, seconds):
+        """Hentikan semua panggilan selama ``seconds`` (misalnya dari header Retry-After 429)."""
+        with self._cond:
+            now = time.monotonic()
+            if self._shared is not None:
+                self._shared.bucket_update(self.rate, self.burst, pause=seconds)
+            self._paused_until = max(self._paused_until, now + seconds)
+            self._tokens = 0.0
+            self._updated = now
+            self.pauses += 1
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            return {
+                "rate": self.rate,
+                "burst": self.burst,
+                "tokens": round(self._tokens, 3),
+                "waiting": self._waiting,
+                "admitted": self.admitted,
+                "queued": self.queued,
+                "rejected": self.rejected,
+                "evicted": self.evicted,
+                "pauses": self.pauses,
+                "calls": self.calls,
+                "paused_for": round(max(0.0, self._paused_until - now), 3),
+            }
+
+
+upstream_limiter = UpstreamRateLimiter()
+
+
+# --- Hedged Request & Circuit Breaker Upstream ---
+
+class UpstreamHedger:
+    """Memotong tail latency dengan hedged request ke OWM.
+
+    Jika percobaan pertama belum menjawab setelah ``delay()`` (persentil
+    ``percentile`` dari latensi terakhir), percobaan kedua dikirim dan yang
+    selesai lebih dulu dipakai. Percobaan kedua hanya dikirim jika limiter
+    masih punya token, jadi hedge tidak pernah melewati kuota OWM.
+    """
+
+    MIN_SAMPLES = 20
+
+    def __init__(self, client, enabled=UPSTREAM_HEDGE_ENABLED, percentile=UPSTREAM_HEDGE_PERCENTILE,
+                 min_delay=UPSTREAM_HEDGE_MIN_DELAY, initial_delay=UPSTREAM_HEDGE_INITIAL_DELAY,
+                 window=500, max_workers=UPSTREAM_POOL_MAXSIZE * 2):
+        self.client = client
+        self.enabled = enabled
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.initial_delay = initial_delay
+        self._samples = deque(maxlen=window)
+        self._delay = initial_delay
+        self._since_recompute = 0
+        self._lock = threading.Lock()
+        self._executor = None
+        self._max_workers = max_workers
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.skipped = 0
+
+    def _observe(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+            self._since_recompute += 1
+            if self._since_recompute >= 50 or len(self._samples) == self.MIN_SAMPLES:
+                # Hitung ulang persentil sesekali saja, bukan di setiap request
+                ordered = sorted(self._samples)
+                index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100.0))
+                self._delay = max(self.min_delay, ordered[index])
+                self._since_recompute = 0
+
+    def delay(self):
+        with self._lock:
+            return self._delay if len(self._samples) >= self.MIN_SAMPLES else self.initial_delay
+
+    def _timed_get(self, url, params):
+        start = time.perf_counter()
+        res = self.client.get(url, params=params)
+        self._observe(time.perf_counter() - start)
+        return res
+
+    def get(self, url, params=None, priority=PRIORITY_INTERACTIVE):
+        """GET ke upstream, di-hedge jika aktif; error dari percobaan yang kalah diabaikan."""
+        if not self.enabled:
+            return self.client.get(url, params=params)
+        with self._lock:
+            self.requests += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="owm-hedge")
+        first = self._executor.submit(self._timed_get, url, params)
+        done, _ = wait([first], timeout=self.delay())
+        if done:
+            return first.result()
+        if not upstream_limiter.try_acquire(priority):
+            with self._lock:
+                self.skipped += 1
+            return first.result()
+        with self._lock:
+            self.hedged += 1
+        second = self._executor.submit(self._timed_get, url, params)
+
+        pending = {first, second}
+        error = None
+        fallback = None
+        for future in as_completed(pending):
+            pending.discard(future)
+            try:
+                res = future.result()
+            except requests.exceptions.RequestException as e:
+                error = e
+                continue
+            if res.status_code >= 500 and pending:
+                fallback = res  # tunggu percobaan lain, mungkin berhasil
+                continue
+            if future is second:
+                with self._lock:
+                    self.hedge_wins += 1
+            return res
+        if fallback is not None:
+            return fallback
+        raise error
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "delay": round(self._delay if len(self._samples) >= self.MIN_SAMPLES else self.initial_delay, 4),
+                "requests": self.requests,
+                "hedged": self.hedged,
+                "hedge_wins": self.hedge_wins,
+                "skipped": self.skipped,
+                "hedge_rate": round(self.hedged / self.requests, 4) if self.requests else 0.0,
+            }
+
+
+upstream_hedger = UpstreamHedger(upstream_client)
+
+
+class CircuitBreaker:
+    """Circuit breaker untuk panggilan ke OWM: closed -> open -> half-open -> closed.
+
+    Setelah ``failure_threshold`` kegagalan berturut-turut (koneksi, timeout,
+    5xx) circuit terbuka dan panggilan langsung ditolak selama ``reset_timeout``
+    detik. Setelah itu satu probe (half-open) diizinkan: sukses menutup circuit,
+    gagal membukanya lagi. Probe yang tidak melapor dalam ``reset_timeout``
+    dianggap hilang dan probe baru diizinkan.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold=UPSTREAM_BREAKER_FAILURES, reset_timeout=UPSTREAM_BREAKER_RESET):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_started = None
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.transitions = {self.CLOSED: 0, self.OPEN: 0, self.HALF_OPEN: 0}
+
+    @property
+    def enabled(self):
+        return self.failure_threshold > 0
+
+    def _transition(self, state):
+        if state != self.state:
+            print(f"Circuit breaker upstream: {self.state} -> {state}")
+            self.state = state
+            self.transitions[state] += 1
+
+    def allow(self):
+        """True jika panggilan boleh dilakukan (closed, atau probe half-open)."""
+        if not self.enabled:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and now - self._opened_at >= self.reset_timeout:
+                self._transition(self.HALF_OPEN)
+                self._probe_started = None
+            if self.state == self.HALF_OPEN and (self._probe_started is None
+                                                 or now - self._probe_started >= self.reset_timeout):
+                self._probe_started = now
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._failures = 0
+            self._probe_started = None
+            self._transition(self.CLOSED)
+
+    def record_failure(self):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                self._probe_started = None
+                self._transition(self.OPEN)
+
+    def retry_after(self):
+        """Perkiraan detik sampai probe berikutnya (untuk header Retry-After)."""
+        with self._lock:
+            remaining = self.reset_timeout - (time.monotonic() - self._opened_at)
+        return max(1, math.ceil(remaining))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "state_code": (self.CLOSED, self.HALF_OPEN, self.OPEN).index(self.state),
+                "consecutive_failures": self._failures,
+                "rejected": self.rejected,
+                "opened": self.transitions[self.OPEN],
+                "half_opened": self.transitions[self.HALF_OPEN],
+                "closed": self.transitions[self.CLOSED],
+            }
+
+
+upstream_breaker = CircuitBreaker()
+
+
+def _circuit_open_result():
+    metrics.count_upstream_error("circuit_open")
+    return {"error": "Upstream circuit open.", "retry_after": upstream_breaker.retry_after(), "circuit_open": True}
+
+
+def _retry_after_seconds(response, default=60):
+    """Baca header Retry-After (detik) dari respons 429."""
+    try:
+        return max(1, int(float(response.headers.get("Retry-After", default))))
+    except (TypeError, ValueError):
+        return default
+
+
+# --- Serialisasi Respons (JSON Pre-Encoded, ETag, Gzip) ---
+
+try:
+    import orjson  # Encoder JSON lebih cepat, dipakai jika terinstall (pip install orjson)
+except ImportError:
+    orjson = None
+
+
+def dumps_json(obj):
+    """Encode obj ke bytes JSON (key terurut seperti jsonify); pakai orjson jika ada."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(obj, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+class EncodedResponse:
+    """Body JSON satu observasi yang sudah di-encode, dengan ETag (hash konten) dan varian gzip."""
+
+    __slots__ = ("body", "etag", "gzip_body")
+
+    def __init__(self, body):
+        self.body = body
+        self.etag = hashlib.blake2b(body, digest_size=12).hexdigest()
+        self.gzip_body = None
+        if GZIP_ENABLED and len(body) >= GZIP_MIN_BYTES:
+            self.gzip_body = gzip.compress(body, compresslevel=6, mtime=0)
+
+    def negotiate(self, if_none_match=None, accept_encoding=None):
+        """Pilih respons berdasarkan header request; mengembalikan (status, body, headers).
+
+        ETag varian gzip diberi akhiran ``-gz`` supaya tiap representasi punya ETag sendiri.
+        """
+        use_gzip = self.gzip_body is not None and _accepts_gzip(accept_encoding)
+        etag = f'"{self.etag}-gz"' if use_gzip else f'"{self.etag}"'
+        headers = {"ETag": etag, "Vary": "Accept-Encoding"}
+        if if_none_match and _etag_matches(if_none_match, self.etag):
+            return 304, b"", headers
+        if use_gzip:
+            headers["Content-Encoding"] = "gzip"
+            return 200, self.gzip_body, headers
+        return 200, self.body, headers
+
+
+def _etag_matches(if_none_match, etag):
+    """Perbandingan lemah If-None-Match (RFC 9110) terhadap ETag dasar maupun varian gzip."""
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate.strip('"') in (etag, f"{etag}-gz"):
+            return True
+    return False
+
+
+def _accepts_gzip(accept_encoding):
+    if not accept_encoding:
+        return False
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        if coding.strip().lower() not in ("gzip", "*"):
+            continue
+        params = params.strip().lower()
+        if params.startswith("q="):
+            try:
+                return float(params[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
+# --- Cache Respons Cuaca (TTL + LRU) ---
+
+def normalize_city_key(city):
+    """Normalisasi nama kota untuk kunci cache (" Jakarta ", "JAKARTA" -> "jakarta")."""
+    return " ".join(city.split()).casefold()
+
+
+def snap_to_grid(lat, lon, grid=GEO_GRID_DEGREES):
+    """Bulatkan koordinat ke titik tengah sel grid, sehingga pengguna yang berdekatan berbagi satu sel.
+
+    ``grid`` <= 0 berarti tanpa snapping: koordinat hanya dinormalisasi (6 desimal).
+    """
+    lon = (lon + 180.0) % 360.0 - 180.0
+    if grid > 0:
+        lat_cell = max(-90.0, min(90.0, round(lat / grid) * grid))
+        lon_cell = round(lon / grid) * grid
+    else:
+        lat_cell, lon_cell = max(-90.0, min(90.0, lat)), lon
+    if lon_cell >= 180.0:
+        lon_cell -= 360.0  # meridian 180 dan -180 adalah sel yang sama
+    return round(lat_cell, 6) + 0.0, round(lon_cell, 6) + 0.0  # + 0.0: -0.0 -> 0.0
+
+
+def cache_key_for(query):
+    """Kunci cache untuk nama kota atau sel koordinat (lat, lon) yang sudah di-snap.
+
+    Nama kota yang dikenal indeks memakai nama kanonik ("jakarta", "Jakarta, ID" -> "jakarta,id").
+    """
+    if isinstance(query, tuple):
+        return f"geo:{query[0]},{query[1]}"
+    return normalize_city_key(city_index.canonical_query(query))
+
+
+class WeatherCache:
+    """Cache in-process dengan TTL dan eviksi LRU, thread-safe.
+
+    Entri yang melewati TTL masih dikembalikan (ditandai stale) sampai umur
+    ``ttl + max_stale``, supaya pemanggil bisa menyajikan data lama sambil satu
+    refresh berjalan di background (stale-while-revalidate).
+    """
+
+    def __init__(self, ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES, max_stale=CACHE_MAX_STALE_SECONDS):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_stale = max_stale
+        self._entries = OrderedDict()  # key -> (value, stored_at, EncodedResponse atau None)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Mengembalikan (value, is_stale); (None, False) jika tidak ada/terlalu lama."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None, False
+            value, stored_at, _ = entry
+            age = now - stored_at
+            if age > self.ttl + self.max_stale:
+                del self._entries[key]
+                self.misses += 1
+                return None, False
+            self._entries.move_to_end(key)
+            if age > self.ttl:
+                self.stale_hits += 1
+                return value, True
+            self.hits += 1
+            return value, False
+
+    def set(self, key, value, age=0.0):
+        """Simpan value; ``age`` (detik) untuk entri yang sudah berumur, misalnya saat warm restart."""
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() - age, None)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def age(self, key):
+        """Umur entri dalam detik, atau None; tidak mengubah urutan LRU maupun counter hit/miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+        return None if entry is None else time.monotonic() - entry[1]
+
+    def encoded(self, key, value):
+        """EncodedResponse untuk value; di-encode sekali per observasi lalu disimpan di entri cache."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is value and entry[2] is not None:
+                return entry[2]
+        encoded = EncodedResponse(dumps_json(value))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is value:
+                self._entries[key] = (value, entry[1], encoded)
+        return encoded
+
+    def begin_refresh(self, key):
+        """Klaim hak refresh untuk key; False jika refresh lain sedang berjalan."""
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            return True
+
+    def end_refresh(self, key):
+        with self._lock:
+            self._refreshing.discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "refreshing": len(self._refreshing),
+            }
+
+
+weather_cache = WeatherCache()
+
+
+# --- Cache Bersama Lintas Proses (File Memory-Mapped) ---
+
+class SharedWeatherCache:
+    """Cache observasi yang bisa dibaca/ditulis semua worker pre-fork, kunci nama kota ternormalisasi.
+
+    File dibagi menjadi slot berukuran tetap; slot dipilih dari hash kunci dengan
+    linear probing beberapa langkah (slot terlama ditimpa jika semua terpakai).
+    Penulis saling mengunci dengan fcntl.lockf (antar proses) plus lock thread;
+    pembaca tidak mengunci dan memakai nomor urut ala seqlock untuk mendeteksi
+    tulisan yang sedang berjalan. Setiap slot juga menyimpan lease fetch supaya
+    hanya satu worker yang memanggil OWM untuk kota yang sama.
+    """
+
+    HEADER = struct.Struct("<Q16sddI")  # seq, digest kunci, stored_at (wall clock), lease_until, panjang payload
+    SEQ = struct.Struct("<Q")
+    FIELDS = struct.Struct("<16sddI")  # HEADER tanpa seq (ditulis sebelum seq genap)
+    BUCKET = struct.Struct("<ddd")  # token bucket upstream bersama: token, updated, paused_until (wall clock)
+    CONTROL_BYTES = 64  # area di awal file sebelum slot pertama
+    PROBES = 8
+
+    def __init__(self, path=SHARED_CACHE_PATH, slots=SHARED_CACHE_SLOTS, slot_bytes=SHARED_CACHE_SLOT_BYTES,
+                 max_age=CACHE_TTL_SECONDS + CACHE_MAX_STALE_SECONDS):
+        self.path = path
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.max_age = max_age
+        self._fd = None
+        self._map = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.oversize = 0
+        self.lease_waits = 0
+
+    @property
+    def enabled(self):
+        return self._map is not None
+
+    def open(self):
+        """Buat/buka file lalu map ke memori (idempotent); panggil sebelum fork supaya worker mewarisi map."""
+        if self._map is not None:
+            return
+        size = self.CONTROL_BYTES + self.slots * self.slot_bytes
+        if self.path:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        else:
+            fd, tmp_path = tempfile.mkstemp(prefix="weather_shared_", suffix=".cache")
+            os.unlink(tmp_path)  # cukup hidup selama fd terbuka
+        if os.fstat(fd).st_size != size:
+            # Ukuran berubah (atau file baru): layout lama tidak valid, mulai dari kosong
+            os.ftruncate(fd, 0)
+            os.ftruncate(fd, size)
+        self._fd = fd
+        self._map = mmap.mmap(fd, size)
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            os.close(self._fd)
+            self._map = None
+            self._fd = None
+
+    @staticmethod
+    def _digest(key):
+        return hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+
+    def _probe(self, digest):
+        start = int.from_bytes(digest[:8], "little") % self.slots
+        return [(start + i) % self.slots for i in range(min(self.PROBES, self.slots))]
+
+    def _read_slot(self, index):
+        """(digest, stored_at, lease_until, payload) yang konsisten, atau None jika slot terus berubah/rusak."""
+        offset = self.CONTROL_BYTES + index * self.slot_bytes
+        capacity = self.slot_bytes - self.HEADER.size
+        for _ in range(100):
+            seq, digest, stored_at, lease_until, length = self.HEADER.unpack_from(self._map, offset)
+            if seq & 1:
+                time.sleep(0)  # penulis sedang di tengah tulisan
+                continue
+            if length > capacity:
+                return None
+            start = offset + self.HEADER.size
+            payload = self._map[start:start + length]
+            if self.HEADER.unpack_from(self._map, offset)[0] == seq:
+                return digest, stored_at, lease_until, payload
+        return None
+
+    def _write_slot(self, index, digest, stored_at, lease_until, payload):
+        """Tulis satu slot; pemanggil memegang _write_lock."""
+        offset = self.CONTROL_BYTES + index * self.slot_bytes
+        seq = self.HEADER.unpack_from(self._map, offset)[0]
+        odd = seq if seq & 1 else seq + 1  # seq ganjil = sedang ditulis (atau penulis sebelumnya crash)
+        self.SEQ.pack_into(self._map, offset, odd)
+        start = offset + self.HEADER.size
+        self._map[start:start + len(payload)] = payload
+        self.FIELDS.pack_into(self._map, offset + self.SEQ.size, digest, stored_at, lease_until, len(payload))
+        # seq genap ditulis terakhir dan terpisah: pembaca tidak bisa melihatnya bersama header lama
+        self.SEQ.pack_into(self._map, offset, odd + 1)
+
+    @contextmanager
+    def _write_lock(self):
+        import fcntl  # hanya POSIX; mode multi-proses memang butuh os.fork
+
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+
+    def _find(self, digest):
+        """Indeks slot berisi digest, atau None."""
+        for index in self._probe(digest):
+            slot = self._read_slot(index)
+            if slot is not None and slot[0] == digest:
+                return index
+        return None
+
+    def _slot_for_write(self, digest, now):
+        """Slot milik digest, slot kosong/kedaluwarsa pertama, atau slot terlama di urutan probe."""
+        victim, victim_time = None, None
+        for index in self._probe(digest):
+            slot = self._read_slot(index)
+            if slot is None:
+                return index
+            slot_digest, stored_at, lease_until, payload = slot
+            if slot_digest == digest:
+                return index
+            if lease_until <= now and (not payload or now - stored_at > self.max_age):
+                return index
+            last_used = max(stored_at, lease_until)
+            if victim is None or last_used < victim_time:
+                victim, victim_time = index, last_used
+        return victim
+
+    def get(self, key):
+        """Mengembalikan (value, umur dalam detik) atau (None, None)."""
+        if self._map is None:
+            return None, None
+        digest = self._digest(key)
+        index = self._find(digest)
+        if index is not None:
+            slot = self._read_slot(index)
+            if slot is not None and slot[0] == digest and slot[3]:
+                age = max(0.0, time.time() - slot[1])
+                if age <= self.max_age:
+                    try:
+                        value = json.loads(slot[3])
+                    except ValueError:
+                        value = None
+                    if value is not None:
+                        with self._lock:
+                            self.hits += 1
+                        return value, age
+        with self._lock:
+            self.misses += 1
+        return None, None
+
+    def set(self, key, value, stored_at=None):
+        """Simpan value untuk semua worker (sekaligus melepas lease fetch); False jika tidak muat di slot.
+
+        Lease tetap dilepas jika value tidak disimpan, supaya worker lain tidak menunggu sampai lease habis.
+        """
+        if self._map is None:
+            return False
+        payload = dumps_json(value)
+        if len(payload) > self.slot_bytes - self.HEADER.size:
+            with self._lock:
+                self.oversize += 1
+            self.release_lease(key)
+            return False
+        digest = self._digest(key)
+        now = time.time()
+        with self._write_lock():
+            index = self._slot_for_write(digest, now)
+            self._write_slot(index, digest, stored_at or now, 0.0, payload)
+            self.writes += 1
+        return True
+
+    def bucket_update(self, rate, burst, take=False, pause=0.0):
+        """Token bucket upstream bersama semua worker (selalu di bawah _write_lock).
+
+        Isi ulang token, lalu ambil satu token jika ``take`` atau hentikan semua
+        panggilan selama ``pause`` detik (429). Mengembalikan (token diambil,
+        token tersisa, detik sampai pause selesai).
+        """
+        with self._write_lock():
+            tokens, updated, paused_until = self.BUCKET.unpack_from(self._map, 0)
+            now = time.time()
+            if updated <= 0.0 or updated > now:
+                tokens, updated = float(burst), now  # file baru (atau jam mundur): mulai dari bucket penuh
+            tokens = min(float(burst), tokens + (now - updated) * rate)
+            if pause:
+                paused_until = max(paused_until, now + pause)
+                tokens = 0.0
+            taken = take and tokens >= 1 and now >= paused_until
+            if taken:
+                tokens -= 1
+            self.BUCKET.pack_into(self._map, 0, tokens, now, paused_until)
+        return taken, tokens, max(0.0, paused_until - now)
+
+    def try_lease(self, key, seconds):
+        """Klaim hak fetch upstream untuk key selama ``seconds``; False jika worker lain memegangnya."""
+        if self._map is None:
+            return True
+        digest = self._digest(key)
+        now = time.time()
+        with self._write_lock():
+            index = self._slot_for_write(digest, now)
+            slot = self._read_slot(index)
+            if slot is not None and slot[0] == digest:
+                if slot[2] > now:
+                    return False
+                self._write_slot(index, digest, slot[1], now + seconds, slot[3])
+            else:
+                self._write_slot(index, digest, 0.0, now + seconds, b"")
+        return True
+
+    def release_lease(self, key):
+        """Lepas lease tanpa menulis observasi (fetch gagal), supaya worker yang menunggu tidak tertahan."""
+        if self._map is None:
+            return
+        digest = self._digest(key)
+        with self._write_lock():
+            index = self._find(digest)
+            if index is None:
+                return
+            slot = self._read_slot(index)
+            if slot is not None and slot[0] == digest and slot[2]:
+                self._write_slot(index, digest, slot[1], 0.0, slot[3])
+
+    def wait_for(self, key, newer_than, timeout, poll=0.05):
+        """Tunggu observasi yang ditulis setelah ``newer_than`` (wall clock) selama lease masih dipegang.
+
+        Mengembalikan (value, umur) atau (None, None) jika lease dilepas/kedaluwarsa atau timeout.
+        """
+        with self._lock:
+            self.lease_waits += 1
+        digest = self._digest(key)
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            index = self._find(digest)
+            slot = self._read_slot(index) if index is not None else None
+            if slot is None or slot[0] != digest:
+                break
+            if slot[3] and slot[1] >= newer_than:
+                return self.get(key)
+            if slot[2] <= time.time():
+                break
+            time.sleep(poll)
+        return None, None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self._map is not None,
+                "slots": self.slots,
+                "slot_bytes": self.slot_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "writes": self.writes,
+                "oversize": self.oversize,
+                "lease_waits": self.lease_waits,
+            }
+
+
+shared_cache = SharedWeatherCache()  # hanya dibuka di mode multi-proses (run_api_workers)
+
+
+# --- Indeks Nama Kota Offline & Cache Negatif ---
+
+def _fold_city_name(name):
+    """Kunci indeks: dinormalisasi seperti kunci cache, tanpa diakritik ("São Paulo" -> "sao paulo")."""
+    decomposed = unicodedata.normalize("NFKD", normalize_city_key(name))
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+class CityIndex:
+    """Indeks nama kota dari file data (nama<TAB>kode negara, urut populasi), dimuat sekali saat dipakai.
+
+    Kunci disimpan dalam array terurut, jadi autocomplete prefix cukup satu
+    bisect plus scan pendek; resolusi nama kanonik berupa lookup dict.
+    """
+
+    SCAN_LIMIT = 200  # maksimal kandidat prefix yang diperingkat per suggest
+
+    def __init__(self, path=CITY_INDEX_PATH):
+        self.path = path
+        self._keys = []      # kunci terurut (boleh duplikat untuk nama sama di negara berbeda)
+        self._entries = []   # sejajar dengan _keys: (rank, nama, kode negara)
+        self._by_name = {}   # kunci -> list (rank, nama, kode negara), rank terkecil dulu
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            rows = []
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    for line in f:
+                        if not line.strip() or line.startswith("#"):
+                            continue
+                        name, _, country = line.rstrip("\n").partition("\t")
+                        rows.append((_fold_city_name(name), (len(rows), name.strip(), country.strip().upper())))
+            except OSError as e:
+                print(f"Error loading city index {self.path}: {e}")
+            rows.sort()
+            self._keys = [key for key, _ in rows]
+            self._entries = [entry for _, entry in rows]
+            for key, entry in rows:
+                self._by_name.setdefault(key, []).append(entry)
+            self._loaded = True
+
+    def __len__(self):
+        self._ensure_loaded()
+        return len(self._keys)
+
+    def resolve(self, query):
+        """(nama, kode negara) kanonik untuk "Jakarta" atau "jakarta, id"; None jika tidak dikenal."""
+        self._ensure_loaded()
+        name, _, country = query.partition(",")
+        candidates = self._by_name.get(_fold_city_name(name))
+        if not candidates:
+            return None
+        country = country.strip().upper()
+        for _, canonical, code in candidates:
+            if not country or code == country:
+                return canonical, code
+        return None
+
+    def canonical_query(self, query):
+        """Query OWM kanonik ("Jakarta,ID") jika kota dikenal; selain itu query apa adanya."""
+        resolved = self.resolve(query)
+        return f"{resolved[0]},{resolved[1]}" if resolved else query
+
+    def suggest(self, prefix, limit=10):
+        """Kota yang namanya diawali ``prefix``, diurutkan dari yang terpopuler: list (nama, kode negara)."""
+        self._ensure_loaded()
+        key = _fold_city_name(prefix)
+        if not key:
+            return []
+        start = bisect.bisect_left(self._keys, key)
+        matches = []
+        for index in range(start, min(start + self.SCAN_LIMIT, len(self._keys))):
+            if not self._keys[index].startswith(key):
+                break
+            matches.append(self._entries[index])
+        matches.sort()
+        return [(name, country) for _, name, country in matches[:limit]]
+
+    def top(self, limit):
+        """``limit`` kota terpopuler (urutan file data): list (nama, kode negara)."""
+        self._ensure_loaded()
+        return [(name, country) for _, name, country in sorted(self._entries)[:limit]]
+
+    def stats(self):
+        return {"cities": len(self), "loaded": self._loaded}
+
+
+city_index = CityIndex()
+
+
+class NegativeCache:
+    """Kunci kota yang dijawab 404 oleh OWM, diingat selama ``ttl`` detik supaya tidak ditanyakan ulang."""
+
+    def __init__(self, ttl=NEGATIVE_CACHE_TTL, max_entries=NEGATIVE_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> waktu kedaluwarsa (monotonic)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.additions = 0
+
+    def add(self, key):
+        with self._lock:
+            self._entries[key] = time.monotonic() + self.ttl
+            self._entries.move_to_end(key)
+            self.additions += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __contains__(self, key):
+        return self.contains(key)
+
+    def contains(self, key, record=True):
+        """True jika ``key`` masih di cache negatif; ``record=False`` tidak menghitung hit."""
+        with self._lock:
+            expires_at = self._entries.get(key)
+            if expires_at is None:
+                return False
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return False
+            if record:
+                self.hits += 1
+            return True
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._entries), "ttl": self.ttl, "hits": self.hits, "additions": self.additions}
+
+
+negative_cache = NegativeCache()
+CITY_NOT_FOUND = {"error": "city not found"}
+
+
+# --- Penyimpanan Observasi (SQLite WAL) ---
+
+class ObservationStore:
+    """Append-only log observasi cuaca di SQLite (mode WAL).
+
+    Penulisan dilakukan secara batch oleh satu writer thread, jadi ``append``
+    dari thread request hanya memasukkan item ke queue. Dipakai untuk mengisi
+    ulang cache saat startup (warm restart) dan untuk query histori.
+    """
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS observations ("
+        " id INTEGER PRIMARY KEY,"
+        " city_key TEXT NOT NULL,"
+        " observed_at REAL NOT NULL,"
+        " payload TEXT NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS idx_observations_city_time ON observations (city_key, observed_at)",
+        "CREATE INDEX IF NOT EXISTS idx_observations_time ON observations (observed_at)",
+    )
+
+    def __init__(self, path=STORE_PATH, batch_size=STORE_BATCH_SIZE, flush_interval=STORE_FLUSH_INTERVAL,
+                 retention_days=STORE_RETENTION_DAYS, max_queue=10000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retention_seconds = retention_days * 86400
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+
+    @property
+    def enabled(self):
+        """True setelah ``start`` berhasil membuat schema dan menjalankan writer thread."""
+        return self._thread is not None
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5.0)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def start(self):
+        """Buat schema lalu jalankan writer thread (idempotent)."""
+        if self._thread is not None:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        try:
+            with conn:
+                for statement in self.SCHEMA:
+                    conn.execute(statement)
+        finally:
+            conn.close()
+        self._thread = threading.Thread(target=self._writer, name="observation-writer", daemon=True)
+        self._thread.start()
+
+    def append(self, key, observation, observed_at=None):
+        """Antrekan satu observasi; tidak pernah memblokir thread request."""
+        if self._thread is None:
+            return
+        try:
+            self._queue.put_nowait((key, observed_at or time.time(), observation))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def _writer(self):
+        conn = self._connect()
+        last_prune = 0.0
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            rows = [(key, observed_at, json.dumps(observation)) for key, observed_at, observation in batch if key]
+            try:
+                with conn:
+                    conn.executemany("INSERT INTO observations (city_key, observed_at, payload) VALUES (?, ?, ?)", rows)
+                    if self.retention_seconds and time.time() - last_prune > 3600:
+                        conn.execute("DELETE FROM observations WHERE observed_at < ?",
+                                     (time.time() - self.retention_seconds,))
+                        last_prune = time.time()
+                with self._lock:
+                    self.written += len(rows)
+                    self.batches += 1
+            except sqlite3.Error as e:
+                print(f"Error writing observations: {e}")
+                with self._lock:
+                    self.dropped += len(rows)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def flush(self):
+        """Tunggu sampai semua observasi di queue tertulis."""
+        if self._thread is not None:
+            self._queue.join()
+
+    def recent(self, max_age):
+        """Observasi terbaru per kota yang umurnya <= max_age detik: list (key, observation, age)."""
+        now = time.time()
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT city_key, payload, MAX(observed_at) FROM observations"
+                " WHERE observed_at >= ? GROUP BY city_key", (now - max_age,)).fetchall()
+        finally:
+            conn.close()
+        return [(key, json.loads(payload), max(0.0, now - observed_at)) for key, payload, observed_at in rows]
+
+    def latest(self, key):
+        """Observasi terakhir satu kota berapa pun umurnya: (observed_at, observation) atau None."""
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT observed_at, payload FROM observations WHERE city_key = ?"
+                " ORDER BY observed_at DESC LIMIT 1", (key,)).fetchone()
+        finally:
+            conn.close()
+        return None if row is None else (row[0], json.loads(row[1]))
+
+    def history(self, key, ts_from, ts_to, limit=1000):
+        """Observasi satu kota dalam rentang waktu [ts_from, ts_to], urut waktu: list (observed_at, observation)."""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT observed_at, payload FROM observations"
+                " WHERE city_key = ? AND observed_at BETWEEN ? AND ? ORDER BY observed_at LIMIT ?",
+                (key, ts_from, ts_to, limit)).fetchall()
+        finally:
+            conn.close()
+        return [(observed_at, json.loads(payload)) for observed_at, payload in rows]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self._thread is not None,
+                "queued": self._queue.qsize(),
+                "written": self.written,
+                "dropped": self.dropped,
+                "batches": self.batches,
+            }
+
+
+observation_store = ObservationStore()
+
+
+def init_observation_store():
+    """Mulai penyimpanan observasi dan isi cache dari observasi terbaru (warm restart)."""
+    if not STORE_PATH:
+        return
+    try:
+        observation_store.start()
+        warm = observation_store.recent(weather_cache.ttl + weather_cache.max_stale)
+    except (OSError, sqlite3.Error) as e:
+        print(f"Error opening observation store {STORE_PATH}: {e}")
+        return
+    for key, observation, age in sorted(warm, key=lambda row: -row[2]):
+        weather_cache.set(key, observation, age=age)
+    if warm:
+        print(f"Cache diisi ulang dengan {len(warm)} observasi dari {STORE_PATH}")
+
+
+def remember_weather(key, weather):
+    """Simpan observasi baru ke cache panas, cache bersama antar worker, dan penyimpanan disk."""
+    weather_cache.set(key, weather)
+    shared_cache.set(key, weather)
+    observation_store.append(key, weather)
+    update_hub.publish(key, weather)
+
+
+# --- Single-Flight: Gabungkan Panggilan Upstream yang Identik ---
+
+class SingleFlight:
+    """Memastikan hanya satu panggilan berjalan per key pada satu waktu.
+
+    Pemanggil pertama (leader) menjalankan fungsi; pemanggil lain untuk key yang
+    sama menunggu dan menerima hasil (atau exception) yang sama.
+    """
+
+    class _Call:
+        __slots__ = ("done", "result", "error")
+
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.leads = 0
+        self.joins = 0
+
+    def do(self, key, fn, *args, **kwargs):
+        """Menjalankan fn sekali per key; mengembalikan (result, is_leader)."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.joins += 1
+                leader = False
+            else:
+                call = self._calls[key] = self._Call()
+                self.leads += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, False
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, True
+
+    def stats(self):
+        with self._lock:
+            return {"leads": self.leads, "joins": self.joins, "in_flight": len(self._calls)}
+
+
+upstream_flight = SingleFlight()
+
+
+# --- Flask API Server ---
+# Kode Flask server tetap sama
+app = Flask(__name__)
+
+def _transform_owm_weather(data):
+    """Ubah payload cuaca OWM (endpoint weather/group) ke format respons API."""
+    # Endpoint group menaruh timezone di dalam 'sys'
+    timezone_offset = data.get('timezone', data['sys'].get('timezone', 0))
+    sunrise_utc = datetime.datetime.utcfromtimestamp(data['sys']['sunrise'])
+    sunset_utc = datetime.datetime.utcfromtimestamp(data['sys']['sunset'])
+    sunrise_local = sunrise_utc + datetime.timedelta(seconds=timezone_offset)
+    sunset_local = sunset_utc + datetime.timedelta(seconds=timezone_offset)
+
+    weather = {
+        "city": f"{data['name']}, {data['sys']['country']}",
+        "temp": data['main']['temp'],
+        "description": data['weather'][0]['description'].capitalize(),
+        "humidity": data['main']['humidity'],
+        "wind_speed": data['wind']['speed'],
+        "pressure": data['main']['pressure'],
+        "visibility": round(data.get('visibility', 0) / 1000, 1),
+        "sunrise": sunrise_local.strftime('%H:%M'),
+        "sunset": sunset_local.strftime('%H:%M'),
+        "clouds": data['clouds']['all'],
+        "icon": data['weather'][0]['icon'],
+        "feels_like": data['main']['feels_like']
+    }
+    return weather
+
+
+# ID kota OWM yang sudah diketahui (kunci kota ternormalisasi -> id), dipakai untuk lookup group
+owm_city_ids = {}
+
+
+def _owm_weather_params(query):
+    """Parameter endpoint weather OWM untuk nama kota atau sel koordinat (lat, lon)."""
+    params = {
+        "appid": API_KEY,
+        "units": "metric",
+        "lang": "id"
+    }
+    if isinstance(query, tuple):
+        params["lat"], params["lon"] = query
+    else:
+        params["q"] = query
+    return params
+
+
+def _annotate_weather(query, data, weather):
+    """Lengkapi hasil transform: sel grid untuk lookup koordinat, ID OWM untuk lookup nama kota."""
+    if isinstance(query, tuple):
+        weather["cell"] = {"lat": query[0], "lon": query[1], "grid": GEO_GRID_DEGREES}
+    elif "id" in data:
+        owm_city_ids[normalize_city_key(query)] = data["id"]
+    return weather
+
+
+# Jenis kegagalan upstream -> pesan error untuk klien (sama untuk mode Flask dan asyncio)
+UPSTREAM_ERROR_MESSAGES = {
+    "http_error": "HTTP Error: {}",
+    "connection_error": "Connection Error. Please check your internet.",
+    "timeout": "Request Timeout.",
+    "network_error": "Network Error: {}",
+    "invalid_data": "Invalid data format from API.",
+    "unexpected": "An unexpected error occurred: {}",
+}
+
+
+def _record_upstream_status(status):
+    """Catat status HTTP dari OWM ke circuit breaker (hanya 5xx dihitung gagal)."""
+    if status >= 500:
+        upstream_breaker.record_failure()
+    else:
+        upstream_breaker.record_success()
+
+
+def _upstream_status_error(status, reason, retry_after):
+    """Dict error untuk respons OWM non-2xx; ``retry_after`` hanya dipakai untuk 429."""
+    if status == 429:
+        upstream_limiter.pause(retry_after)
+        metrics.count_upstream_error("upstream_429")
+        return {"error": "Upstream rate limit exceeded.", "retry_after": retry_after}
+    return _upstream_error("http_error", f"{status} - {reason}")
+
+
+def _upstream_error(kind, detail=""):
+    """Catat kegagalan upstream (metric, circuit breaker) dan kembalikan dict error-nya."""
+    print(f"Error fetching weather from OWM ({kind}): {detail}")
+    metrics.count_upstream_error(kind)
+    if kind in ("connection_error", "timeout", "network_error"):
+        upstream_breaker.record_failure()  # status HTTP sudah dicatat lewat _record_upstream_status
+    return {"error": UPSTREAM_ERROR_MESSAGES[kind].format(detail)}
+
+
+def _is_read_timeout(e):
+    """ConnectionError dari requests yang sebenarnya read timeout (MaxRetryError berisi ReadTimeoutError)."""
+    reason = getattr(e.args[0], "reason", None) if e.args else None
+    return isinstance(reason, ReadTimeoutError)
+
+
+def _upstream_busy(e):
+    metrics.count_upstream_error("rate_limited")
+    return {"error": "Upstream busy.", "retry_after": e.retry_after}
+
+
+def _weather_from_owm_body(city, body):
+    """Parse dan transform body respons OWM (bytes) menjadi observasi."""
+    with metrics.time_stage("parse"):
+        data = json.loads(body)
+    with metrics.time_stage("transform"):
+        return _annotate_weather(city, data, _transform_owm_weather(data))
+
+
+def fetch_weather_from_owm(city, priority=PRIORITY_INTERACTIVE):
+    """Ambil cuaca terkini dari OWM; ``city`` berupa nama kota atau tuple (lat, lon) hasil snap_to_grid."""
+    url = f"{BASE_OWM_API_URL}weather"
+    params = _owm_weather_params(city)
+    try:
+        if not upstream_breaker.allow():
+            return _circuit_open_result()
+        upstream_limiter.acquire(priority)
+        with metrics.time_stage("upstream"):
+            res = upstream_hedger.get(url, params=params, priority=priority)
+            _record_upstream_status(res.status_code)
+        if res.status_code >= 400:
+            return _upstream_status_error(res.status_code, res.reason, _retry_after_seconds(res))
+        return _weather_from_owm_body(city, res.content)
+    except UpstreamBusy as e:
+        return _upstream_busy(e)
+    except requests.exceptions.ConnectionError as e:
+        return _upstream_error("timeout" if _is_read_timeout(e) else "connection_error", e)
+    except requests.exceptions.Timeout as e:
+        return _upstream_error("timeout", e)
+    except requests.exceptions.RequestException as e:
+        return _upstream_error("network_error", e)
+    except (KeyError, IndexError, TypeError, ValueError) as e:
+        return _upstream_error("invalid_data", e)
+    except Exception as e:
+        return _upstream_error("unexpected", e)
+
+
+def fetch_weather_group_from_owm(city_ids):
+    """Ambil cuaca banyak kota sekaligus lewat endpoint group OWM (maks 20 ID per panggilan).
+
+    Mengembalikan dict {city_id: weather}; ID yang gagal tidak ada di hasil.
+    """
+    url = f"{BASE_OWM_API_URL}group"
+    params = {
+        "id": ",".join(str(city_id) for city_id in city_ids),
+        "appid": API_KEY,
+        "units": "metric",
+        "lang": "id"
+    }
+    results = {}
+    if not upstream_breaker.allow():
+        metrics.count_upstream_error("circuit_open")
+        return results
+    try:
+        upstream_limiter.acquire(PRIORITY_BATCH)
+        with metrics.time_stage("upstream"):
+            try:
+                res = upstream_hedger.get(url, params=params, priority=PRIORITY_BATCH)
+            except requests.exceptions.RequestException:
+                upstream_breaker.record_failure()
+                raise
+            if res.status_code >= 500:
+                upstream_breaker.record_failure()
+            else:
+                upstream_breaker.record_success()
+            if res.status_code == 429:
+                upstream_limiter.pause(_retry_after_seconds(res))
+            res.raise_for_status()
+        with metrics.time_stage("parse"):
+            entries = res.json().get("list", [])
+        with metrics.time_stage("transform"):
+            for data in entries:
+                try:
+                    results[data["id"]] = _transform_owm_weather(data)
+                except (KeyError, IndexError, TypeError) as e:
+                    print(f"Error parsing OWM group entry (missing key): {e}")
+                    metrics.count_upstream_error("invalid_data")
+    except Exception as e:
+        print(f"Error fetching weather group from OWM: {e}")
+        metrics.count_upstream_error("group_error")
+    return results
+
+
+def _wait_for_other_worker(key):
+    """Mode multi-proses: pakai hasil worker lain jika ada yang baru saja/sedang mengambil key ini.
+
+    Mengembalikan observasi dari cache bersama, atau None jika pemanggil harus
+    fetch sendiri (lease berhasil diklaim, atau worker lain gagal/timeout).
+    """
+    value, age = shared_cache.get(key)
+    if value is not None and age <= weather_cache.ttl:
+        weather_cache.set(key, value, age=age)
+        return value
+    started = time.time()
+    if shared_cache.try_lease(key, SHARED_FETCH_LEASE):
+        return None
+    value, age = shared_cache.wait_for(key, started, SHARED_FETCH_LEASE)
+    if value is not None:
+        weather_cache.set(key, value, age=age)
+    return value
+
+
+def _is_not_found(result):
+    return "not found" in result.get("error", "").lower()
+
+
+def _rejected_city(key, city, record=True):
+    """Hasil "not found" tanpa ke OWM untuk kota di cache negatif (atau di luar indeks pada mode strict).
+
+    ``record=False`` untuk pemeriksaan internal (scheduler) yang tidak boleh menambah hit cache negatif.
+    """
+    if negative_cache.contains(key, record=record):
+        return dict(CITY_NOT_FOUND)
+    if CITY_INDEX_STRICT and not isinstance(city, tuple) and city_index.resolve(city) is None:
+        return dict(CITY_NOT_FOUND)
+    return None
+
+
+def _last_known_weather(key):
+    """Observasi terakhir dari disk (ditandai ``stale``) saat circuit breaker terbuka; None jika tidak ada."""
+    if not observation_store.enabled:
+        return None
+    try:
+        row = observation_store.latest(key)
+    except sqlite3.Error as e:
+        print(f"Error reading last known observation: {e}")
+        return None
+    if row is None:
+        return None
+    observed_at, observation = row
+    return dict(observation, stale=True,
+                observed_at=datetime.datetime.fromtimestamp(observed_at, datetime.timezone.utc).isoformat())
+
+
+def _upstream_query(city):
+    """Query yang dikirim ke OWM: nama kanonik dari indeks ("Jakarta,ID") atau koordinat apa adanya."""
+    return city if isinstance(city, tuple) else city_index.canonical_query(city)
+
+
+def _fetch_and_store(key, city, priority=PRIORITY_INTERACTIVE):
+    rejected = _rejected_city(key, city)
+    if rejected is not None:
+        return rejected
+    if shared_cache.enabled:
+        shared = _wait_for_other_worker(key)
+        if shared is not None:
+            return shared
+    return _store_fetch_result(key, fetch_weather_from_owm(_upstream_query(city), priority))
+
+
+def _store_fetch_result(key, result):
+    """Simpan hasil fetch ke cache (atau cache negatif untuk 404); dipakai mode Flask dan asyncio.
+
+    Saat circuit breaker terbuka, observasi terakhir dari disk dikembalikan jika ada.
+    """
+    if "error" not in result:
+        remember_weather(key, result)
+        return result
+    if _is_not_found(result):
+        negative_cache.add(key)
+    shared_cache.release_lease(key)
+    if result.get("circuit_open"):
+        return _last_known_weather(key) or result
+    return result
+
+
+def fetch_weather_coalesced(key, city, priority=PRIORITY_INTERACTIVE):
+    """fetch_weather_from_owm lewat single-flight; mengembalikan (result, is_leader)."""
+    return upstream_flight.do(key, _fetch_and_store, key, city, priority)
+
+
+def _refresh_weather(key, city):
+    """Refresh background untuk entri stale (dipanggil dari thread terpisah)."""
+    try:
+        fetch_weather_coalesced(key, city, PRIORITY_BACKGROUND)
+    finally:
+        weather_cache.end_refresh(key)
+
+
+def _get_cached_weather(key, city, record=True):
+    """Lookup cache; entri stale tetap dikembalikan sambil memicu satu refresh background.
+
+    ``record=False`` untuk pembacaan internal (ticker stream) supaya tidak
+    menaikkan skor kota di scheduler refresh.
+    """
+    if record:
+        refresh_scheduler.record_request(key, city)
+    cached, is_stale = weather_cache.get(key)
+    if cached is None and shared_cache.enabled:
+        # Miss lokal: observasi mungkin sudah diambil worker lain
+        cached, age = shared_cache.get(key)
+        if cached is not None:
+            weather_cache.set(key, cached, age=age)
+            is_stale = age > weather_cache.ttl
+    if cached is not None and is_stale and weather_cache.begin_refresh(key):
+        threading.Thread(target=_refresh_weather, args=(key, city), daemon=True).start()
+    return cached
+
+
+def get_weather(city):
+    """Ambil cuaca lewat cache; hanya memanggil OWM saat miss atau refresh stale.
+
+    ``city`` berupa nama kota atau tuple (lat, lon) yang sudah di-snap ke grid.
+    """
+    key = cache_key_for(city)
+    cached = _get_cached_weather(key, city)
+    if cached is not None:
+        return cached
+
+    result, _ = fetch_weather_coalesced(key, city)
+    return result
+
+
+OWM_GROUP_MAX_IDS = 20
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_MAX_WORKERS, thread_name_prefix="weather-batch")
+
+
+def _fetch_group_and_store(id_to_key):
+    results = {}
+    for city_id, weather in fetch_weather_group_from_owm(list(id_to_key)).items():
+        key = id_to_key.get(city_id)
+        if key is not None:
+            remember_weather(key, weather)
+            results[key] = weather
+    return results
+
+
+def get_weather_batch(cities):
+    """Ambil cuaca banyak kota secara konkuren; mengembalikan list (city, result) sesuai urutan input.
+
+    Kota yang ada di cache langsung disajikan, miss dengan ID OWM yang sudah
+    diketahui diambil lewat endpoint group, sisanya lewat worker pool.
+    """
+    pending = OrderedDict()
+    for city in cities:
+        pending.setdefault(cache_key_for(city), city)
+
+    results = {}
+    for key, city in pending.items():
+        cached = _get_cached_weather(key, city)
+        if cached is not None:
+            results[key] = cached
+
+    known_ids = [(owm_city_ids[key], key) for key in pending if key not in results and key in owm_city_ids]
+    group_futures = [
+        batch_executor.submit(_fetch_group_and_store, dict(known_ids[i:i + OWM_GROUP_MAX_IDS]))
+        for i in range(0, len(known_ids), OWM_GROUP_MAX_IDS)
+    ]
+    for future in group_futures:
+        results.update(future.result())
+
+    # Sisanya (ID belum diketahui atau gagal di group) diambil satu per satu secara konkuren
+    remaining = [(key, city) for key, city in pending.items() if key not in results]
+    single_futures = {key: batch_executor.submit(fetch_weather_coalesced, key, city, PRIORITY_BATCH)
+                      for key, city in remaining}
+    for key, future in single_futures.items():
+        try:
+            results[key] = future.result()[0]
+        except Exception as e:
+            results[key] = {"error": f"An unexpected error occurred: {e}"}
+
+    return [(city, results[cache_key_for(city)]) for city in cities]
+
+
+# --- Scheduler Refresh Proaktif (Hot Set / Watchlist) ---
+
+class RefreshScheduler:
+    """Refresh entri cache kota populer sesaat sebelum TTL habis, dalam batas kuota OWM.
+
+    Frekuensi request per kota dihitung dengan skor yang meluruh (decay) tiap
+    menit; ``hot_size`` kota teratas plus watchlist menjadi hot set. Panggilan
+    refresh diberi jeda minimal 60/kuota detik dan hanya dilakukan jika total
+    panggilan upstream satu menit terakhir (termasuk on-demand) masih di bawah kuota.
+    """
+
+    def __init__(self, cache, watchlist=REFRESH_WATCHLIST, hot_size=REFRESH_HOT_SIZE,
+                 lead_seconds=REFRESH_LEAD_SECONDS, quota_per_minute=OWM_QUOTA_PER_MINUTE,
+                 decay_interval=60.0, tick=1.0):
+        self.cache = cache
+        self.watchlist = {cache_key_for(city): city for city in watchlist}
+        self.hot_size = hot_size
+        self.lead_seconds = lead_seconds
+        self.quota_per_minute = quota_per_minute
+        self.decay_interval = decay_interval
+        self.tick = tick
+        self._scores = {}   # key -> [skor, nama kota]
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._upstream_samples = deque()  # (waktu, upstream_limiter.calls)
+        self._failures = {}  # key -> (jumlah gagal berturut-turut, waktu boleh dicoba lagi)
+        self._last_refresh_at = 0.0
+        self.backlog = 0
+        self.refreshed = 0
+        self.deferred = 0
+
+    def record_request(self, key, city):
+        """Dicatat untuk setiap lookup cuaca (murah: satu update dict)."""
+        with self._lock:
+            entry = self._scores.get(key)
+            if entry is None:
+                self._scores[key] = [1.0, city]
+            else:
+                entry[0] += 1.0
+
+    def watch(self, city):
+        with self._lock:
+            self.watchlist[cache_key_for(city)] = city
+
+    def _decay(self):
+        with self._lock:
+            for key in list(self._scores):
+                entry = self._scores[key]
+                entry[0] *= 0.5
+                if entry[0] < 0.05:
+                    del self._scores[key]
+            for key in list(self._failures):
+                if key not in self._scores and key not in self.watchlist:
+                    del self._failures[key]
+
+    def hot_set(self):
+        """{key: city} untuk watchlist + kota dengan skor tertinggi."""
+        with self._lock:
+            top = sorted(self._scores.items(), key=lambda item: -item[1][0])[:self.hot_size]
+            hot = dict(self.watchlist)
+        for key, (_, city) in top:
+            hot.setdefault(key, city)
+        return hot
+
+    def _quota_used(self, now):
+        """Total panggilan cuaca OWM dalam 60 detik terakhir (dari counter upstream_limiter.calls)."""
+        with self._lock:
+            samples = self._upstream_samples
+            if not samples or now >= samples[-1][0]:
+                samples.append((now, upstream_limiter.calls))
+            while len(samples) > 1 and now - samples[1][0] >= 60.0:
+                samples.popleft()
+            return samples[-1][1] - samples[0][1]
+
+    def _due(self, now):
+        """Entri hot set yang akan/sudah kedaluwarsa, diurutkan dari yang paling mendesak.
+
+        Kota di cache negatif/ditolak indeks dan kota yang sedang di-backoff
+        karena refresh gagal tidak diikutkan.
+        """
+        due = []
+        threshold = self.cache.ttl - self.lead_seconds
+        with self._lock:
+            backoff = {key for key, (_, retry_at) in self._failures.items() if retry_at > now}
+        for key, city in self.hot_set().items():
+            if key in backoff or _rejected_city(key, city, record=False) is not None:
+                continue
+            age = self.cache.age(key)
+            if age is None or age >= threshold:
+                due.append((-(age if age is not None else float("inf")), key, city))
+        due.sort()
+        return [(key, city) for _, key, city in due]
+
+    def run_once(self, now=None):
+        """Satu putaran scheduler; mengembalikan jumlah kota yang di-refresh."""
+        now = now if now is not None else time.monotonic()
+        due = self._due(now)
+        self.backlog = len(due)
+        min_interval = 60.0 / self.quota_per_minute if self.quota_per_minute > 0 else float("inf")
+        refreshed = 0
+        for key, city in due:
+            if now - self._last_refresh_at < min_interval:
+                break  # sebar panggilan: tunggu slot berikutnya
+            if self._quota_used(now) >= self.quota_per_minute:
+                self.deferred += 1
+                break
+            if not self.cache.begin_refresh(key):
+                continue
+            calls_before = upstream_limiter.calls
+            try:
+                result, _ = fetch_weather_coalesced(key, city, PRIORITY_BACKGROUND)
+            finally:
+                self.cache.end_refresh(key)
+            failed = "error" in result or result.get("stale")
+            if failed:
+                self._record_failure(key, now, min_interval)
+            else:
+                with self._lock:
+                    self._failures.pop(key, None)
+            if upstream_limiter.calls == calls_before:
+                continue  # tidak ada panggilan OWM (worker lain/cache negatif): slot tidak terpakai
+            self._last_refresh_at = now
+            self.backlog -= 1
+            if not failed:
+                self.refreshed += 1
+                refreshed += 1
+        return refreshed
+
+    def _record_failure(self, key, now, min_interval):
+        """Backoff eksponensial untuk kota yang refresh-nya gagal terus (maks. satu TTL)."""
+        with self._lock:
+            failures = self._failures.get(key, (0, 0.0))[0] + 1
+            delay = min(max(min_interval, 1.0) * 2 ** failures, self.cache.ttl)
+            self._failures[key] = (failures, now + delay)
+
+    def _run(self):
+        last_decay = time.monotonic()
+        interval = self.tick
+        if self.quota_per_minute > 0:
+            interval = min(self.tick, 60.0 / self.quota_per_minute)
+        while not self._stop.wait(interval):
+            try:
+                self.run_once()
+                if time.monotonic() - last_decay >= self.decay_interval:
+                    self._decay()
+                    last_decay = time.monotonic()
+            except Exception as e:
+                print(f"Error in refresh scheduler: {e}")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="refresh-scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        with self._lock:
+            tracked = len(self._scores)
+            watchlist = len(self.watchlist)
+            backing_off = len(self._failures)
+        return {
+            "running": self._thread is not None,
+            "tracked_cities": tracked,
+            "watchlist": watchlist,
+            "backlog": self.backlog,
+            "refreshed": self.refreshed,
+            "deferred": self.deferred,
+            "backing_off": backing_off,
+            "quota_per_minute": self.quota_per_minute,
+            "quota_used": self._quota_used(time.monotonic()) if self._thread is not None else 0,
+        }
+
+
+refresh_scheduler = RefreshScheduler(weather_cache)
+
+
+# --- Pub/Sub Update Cuaca untuk Klien Streaming ---
+
+class WeatherUpdateHub:
+    """Mengirim observasi baru ke klien yang berlangganan sekumpulan kota.
+
+    ``remember_weather`` mem-publish setiap observasi baru. Thread ticker juga
+    memeriksa cache untuk kota yang di-subscribe setiap ``poll_interval`` detik:
+    memicu refresh stale-while-revalidate dan menangkap observasi yang ditulis
+    worker lain (mode multi-proses). Kota yang di-subscribe tetapi belum ada di
+    cache (misalnya snapshot awal gagal karena limiter) dicoba lagi dengan
+    backoff. Setiap subscription hanya menerima observasi yang berbeda dari
+    yang terakhir dikirim kepadanya.
+    """
+
+    class Subscription:
+        __slots__ = ("keys", "queue", "last_sent", "dropped")
+
+        def __init__(self, keys, max_queue):
+            self.keys = keys  # key -> nama kota yang diminta klien
+            self.queue = queue.Queue(maxsize=max_queue)
+            self.last_sent = {}
+            self.dropped = 0
+
+        def get(self, timeout):
+            """(key, observasi) berikutnya, atau None jika tidak ada update selama ``timeout`` detik."""
+            try:
+                return self.queue.get(timeout=timeout)
+            except queue.Empty:
+                return None
+
+        def wake(self):
+            """Bangunkan ``get`` yang sedang menunggu (dipanggil saat hub ditutup)."""
+            try:
+                self.queue.put_nowait(None)
+            except queue.Full:
+                pass  # antrean penuh: get() langsung kembali tanpa menunggu
+
+    def __init__(self, max_clients=STREAM_MAX_CLIENTS, poll_interval=STREAM_POLL_INTERVAL):
+        self.max_clients = max_clients
+        self.poll_interval = poll_interval
+        self._subscriptions = set()
+        self._watch_counts = {}  # key -> jumlah subscription yang memantau key
+        self._retry = {}  # key -> (jumlah gagal, waktu fetch ulang berikutnya) untuk kota yang belum di cache
+        self._fetching = False
+        self._lock = threading.Lock()
+        self._thread = None
+        self.closed = threading.Event()
+        self.published = 0
+        self.delivered = 0
+        self.rejected = 0
+
+    def subscribe(self, keys):
+        """Daftarkan subscription untuk {key: city}; None jika jumlah klien sudah maksimal."""
+        subscription = self.Subscription(dict(keys), max_queue=max(100, 2 * len(keys)))
+        with self._lock:
+            if len(self._subscriptions) >= self.max_clients:
+                self.rejected += 1
+                return None
+            self._subscriptions.add(subscription)
+            for key in subscription.keys:
+                self._watch_counts[key] = self._watch_counts.get(key, 0) + 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="stream-ticker", daemon=True)
+                self._thread.start()
+        return subscription
+
+    def subscribe_cities(self, cities):
+        """``subscribe`` untuk daftar nama kota (duplikat per kunci cache digabung, nama pertama dipakai)."""
+        keys = OrderedDict()
+        for city in cities:
+            keys.setdefault(cache_key_for(city), city)
+        return self.subscribe(keys)
+
+    def snapshot(self, subscription):
+        """Ambil semua kota subscription sekaligus untuk snapshot awal; yield entri error per kota.
+
+        Hasil sukses diantrekan ke subscription lewat ``offer`` (bukan di-yield
+        langsung), jadi observasi yang juga di-publish oleh fetch yang sama
+        tidak terkirim dua kali.
+        """
+        for city, result in get_weather_batch(list(subscription.keys.values())):
+            if "error" in result:
+                yield _city_entry(city, result)
+            else:
+                self.offer(subscription, cache_key_for(city), result)
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            if subscription not in self._subscriptions:
+                return
+            self._subscriptions.discard(subscription)
+            for key in subscription.keys:
+                remaining = self._watch_counts.get(key, 1) - 1
+                if remaining:
+                    self._watch_counts[key] = remaining
+                else:
+                    self._watch_counts.pop(key, None)
+
+    def _offer(self, subscription, key, value):
+        """Antrekan value jika berbeda dari yang terakhir dikirim; pemanggil memegang _lock."""
+        last = subscription.last_sent.get(key)
+        if last is value or last == value:
+            return
+        subscription.last_sent[key] = value
+        try:
+            subscription.queue.put_nowait((key, value))
+        except queue.Full:
+            # Klien lambat: buang update terlama, yang terbaru lebih berguna
+            try:
+                subscription.queue.get_nowait()
+            except queue.Empty:
+                pass
+            subscription.queue.put_nowait((key, value))
+            subscription.dropped += 1
+        self.delivered += 1
+
+    def offer(self, subscription, key, value):
+        """Kirim value ke satu subscription (misalnya snapshot awal saat klien baru terhubung)."""
+        with self._lock:
+            self._offer(subscription, key, value)
+
+    def publish(self, key, value):
+        """Kirim observasi baru ke semua subscription yang memantau key (murah jika tidak ada)."""
+        if key not in self._watch_counts:
+            return
+        with self._lock:
+            self.published += 1
+            for subscription in self._subscriptions:
+                if key in subscription.keys:
+                    self._offer(subscription, key, value)
+
+    def watched(self):
+        """{key: city} untuk semua kota yang sedang di-subscribe."""
+        with self._lock:
+            watched = {}
+            for subscription in self._subscriptions:
+                watched.update(subscription.keys)
+        return watched
+
+    def close(self):
+        """Hentikan ticker dan bangunkan semua stream supaya generatornya selesai (shutdown worker)."""
+        self.closed.set()
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            subscription.wake()
+
+    def _fetch_missing(self, missing):
+        """Ambil kota yang di-subscribe tetapi belum ada di cache; hasil sukses di-publish oleh remember_weather."""
+        try:
+            for key, city in missing:
+                if self.closed.is_set():
+                    break
+                result, _ = fetch_weather_coalesced(key, city, PRIORITY_BACKGROUND)
+                with self._lock:
+                    if "error" in result or result.get("stale"):
+                        failures = self._retry.get(key, (0, 0.0))[0] + 1
+                        delay = min(self.poll_interval * 2 ** failures, weather_cache.ttl)
+                        delay = max(delay, result.get("retry_after", 0))
+                        self._retry[key] = (failures, time.monotonic() + delay)
+                    else:
+                        self._retry.pop(key, None)
+        finally:
+            with self._lock:
+                self._fetching = False
+
+    def _tick(self):
+        watched = self.watched()
+        missing = []
+        now = time.monotonic()
+        for key, city in watched.items():
+            cached = _get_cached_weather(key, city, record=False)
+            if cached is not None:
+                self.publish(key, cached)
+            elif _rejected_city(key, city) is None:
+                missing.append((key, city))
+        with self._lock:
+            for key in list(self._retry):
+                if key not in watched:
+                    del self._retry[key]
+            missing = [(key, city) for key, city in missing if self._retry.get(key, (0, 0.0))[1] <= now]
+            if not missing or self._fetching:
+                return
+            self._fetching = True
+        threading.Thread(target=self._fetch_missing, args=(missing,), name="stream-fetch", daemon=True).start()
+
+    def _run(self):
+        while not self.closed.wait(self.poll_interval):
+            try:
+                self._tick()
+            except Exception as e:
+                print(f"Error in stream ticker: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "clients": len(self._subscriptions),
+                "watched_cities": len(self._watch_counts),
+                "published": self.published,
+                "delivered": self.delivered,
+                "dropped": sum(subscription.dropped for subscription in self._subscriptions),
+                "rejected": self.rejected,
+            }
+
+
+update_hub = WeatherUpdateHub()
+
+
+def start_background_services():
+    """Mulai penyimpanan observasi (warm restart) dan scheduler refresh."""
+    init_observation_store()
+    if REFRESH_ENABLED:
+        refresh_scheduler.start()
+
+
+def _error_response(result):
+    """Petakan dict error dari fetch ke (body, status HTTP)."""
+    if "retry_after" in result:
+         return {"error": "Layanan cuaca sedang sibuk, coba lagi nanti.", "retry_after": result["retry_after"]}, 503
+    if _is_not_found(result):
+         return {"error": "Kota tidak ditemukan."}, 404
+    return result, 500
+
+
+def _error_headers(body):
+    return {"Retry-After": str(body["retry_after"])} if "retry_after" in body else {}
+
+
+def _parse_weather_query(args):
+    """Ambil query /weather dari ?city= atau ?lat=&lon=; mengembalikan (query, pesan error)."""
+    city = args.get("city")
+    if city:
+        return city, None
+    lat, lon = args.get("lat"), args.get("lon")
+    if not lat and not lon:
+        return None, "Parameter 'city' atau 'lat' dan 'lon' wajib diisi"
+    if not lat or not lon:
+        return None, "Parameter 'lat' dan 'lon' wajib diisi bersamaan"
+    try:
+        lat, lon = float(lat), float(lon)
+    except (TypeError, ValueError):
+        return None, "Parameter 'lat' dan 'lon' harus berupa angka"
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None, "Parameter 'lat' harus -90..90 dan 'lon' harus -180..180"
+    return snap_to_grid(lat, lon), None
+
+
+@app.route("/weather")
+def weather_api():
+    """Cuaca satu lokasi: ?city= atau ?lat=&lon= (koordinat di-snap ke grid, sel dilaporkan di ``cell``)."""
+    query, error = _parse_weather_query(request.args)
+    if error:
+        return jsonify({"error": error}), 400
+
+    result = get_weather(query)
+
+    if "error" in result:
+        body, status = _error_response(result)
+        return jsonify(body), status, _error_headers(body)
+
+    with metrics.time_stage("serialize"):
+        encoded = weather_cache.encoded(cache_key_for(query), result)
+    status, body, headers = encoded.negotiate(request.headers.get("If-None-Match"),
+                                              request.headers.get("Accept-Encoding"))
+    return Response(body, status=status, headers=headers, mimetype="application/json")
+
+
+INVALID_CITIES_BODY = {"error": "Body JSON harus berupa objek {\"cities\": [...]} berisi nama kota (string tidak kosong)"}
+
+
+def _parse_cities(city_values, cities_values, body=None):
+    """Daftar kota dari nilai ?city= (berulang), ?cities=a,b,c, dan body JSON {"cities": [...]}.
+
+    Mengembalikan None jika body JSON valid tetapi bukan objek dengan list ``cities``
+    yang setiap itemnya string tidak kosong.
+    """
+    cities = list(city_values)
+    for value in cities_values:
+        cities.extend(value.split(","))
+    if body is not None:
+        if not isinstance(body, dict) or not isinstance(body.get("cities", []), list):
+            return None
+        body_cities = body.get("cities", [])
+        if not all(isinstance(city, str) and city.strip() for city in body_cities):
+            return None
+        cities.extend(body_cities)
+    return [city.strip() for city in cities if city and city.strip()]
+
+
+def _requested_cities():
+    """Daftar kota dari request Flask (query string, atau juga body JSON untuk POST)."""
+    body = request.get_json(silent=True) if request.method == "POST" else None
+    return _parse_cities(request.args.getlist("city"), request.args.getlist("cities"), body)
+
+
+def _city_entry(city, result):
+    """Entri hasil per kota untuk /weather/batch dan /weather/stream."""
+    if "error" in result:
+        body, status = _error_response(result)
+        return dict(body, city=city, status=status)
+    return {"city": city, "status": 200, "data": result}
+
+
+@app.route("/weather/batch", methods=["GET", "POST"])
+def weather_batch_api():
+    """Cuaca banyak kota: ?cities=a,b,c, ?city=a&city=b, atau body JSON {"cities": [...]}."""
+    body, status = _batch_response(_requested_cities())
+    return jsonify(body), status
+
+
+def _batch_response(cities):
+    """(body, status) /weather/batch untuk daftar kota hasil _parse_cities (Flask dan asyncio)."""
+    if cities is None:
+        return INVALID_CITIES_BODY, 400
+    if not cities:
+        return {"error": "Parameter 'cities' wajib diisi"}, 400
+    if len(cities) > BATCH_MAX_CITIES:
+        return {"error": f"Maksimal {BATCH_MAX_CITIES} kota per batch"}, 400
+    entries = [_city_entry(city, result) for city, result in get_weather_batch(cities)]
+    return {"count": len(entries), "results": entries}, 200
+
+
+@app.route("/weather/stream")
+def weather_stream_api():
+    """Stream observasi baru untuk ?cities=a,b sebagai Server-Sent Events (?format=ndjson untuk NDJSON).
+
+    Klien pertama-tama menerima snapshot semua kota, lalu hanya observasi yang
+    berubah, dalam format entri yang sama dengan /weather/batch.
+    """
+    cities = _requested_cities()
+    if cities is None:
+        return jsonify(INVALID_CITIES_BODY), 400
+    if not cities:
+        return jsonify({"error": "Parameter 'cities' wajib diisi"}), 400
+    if len(cities) > BATCH_MAX_CITIES:
+        return jsonify({"error": f"Maksimal {BATCH_MAX_CITIES} kota per stream"}), 400
+    ndjson = request.args.get("format") == "ndjson" or "application/x-ndjson" in request.headers.get("Accept", "")
+
+    subscription = update_hub.subscribe_cities(cities)
+    if subscription is None:
+        return jsonify({"error": "Terlalu banyak klien streaming, coba lagi nanti."}), 503, {"Retry-After": "5"}
+
+    def encode(entry):
+        if ndjson:
+            return dumps_json(entry) + b"\n"
+        return b"event: weather\ndata: " + dumps_json(entry) + b"\n\n"
+
+    keepalive = b"\n" if ndjson else b": keepalive\n\n"
+
+    def generate():
+        try:
+            for entry in update_hub.snapshot(subscription):
+                yield encode(entry)
+            while not update_hub.closed.is_set():
+                update = subscription.get(STREAM_KEEPALIVE_SECONDS)
+                if update_hub.closed.is_set():
+                    break  # worker sedang shutdown: akhiri stream supaya request selesai
+                if update is None:
+                    yield keepalive
+                    continue
+                key, value = update
+                yield encode(_city_entry(subscription.keys[key], value))
+        finally:
+            # Klien memutus koneksi: generator ditutup oleh server
+            update_hub.unsubscribe(subscription)
+
+    mimetype = "application/x-ndjson" if ndjson else "text/event-stream"
+    return Response(generate(), mimetype=mimetype, headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.route("/cities/suggest")
+def cities_suggest_api():
+    """Autocomplete nama kota dari indeks offline: ?q=<prefix>&limit= (tanpa panggilan ke OWM)."""
+    body, status = _suggest_response(request.args)
+    return jsonify(body), status
+
+
+def _suggest_response(args):
+    """(body, status) /cities/suggest dari query string (Flask dan asyncio)."""
+    prefix = args.get("q", "")
+    try:
+        limit = max(1, min(int(args.get("limit", 10)), 50))
+    except ValueError:
+        limit = 10
+    suggestions = [{"name": name, "country": country, "query": f"{name},{country}"}
+                   for name, country in city_index.suggest(prefix, limit)]
+    return {"query": prefix, "count": len(suggestions), "suggestions": suggestions}, 200
+
+
+def _parse_timestamp(value, default):
+    """Terima unix timestamp atau tanggal ISO 8601 (tanpa zona = UTC); None jika tidak valid."""
+    if value is None or value == "":
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        parsed = datetime.datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed.timestamp()
+
+
+@app.route("/weather/history")
+def weather_history_api():
+    """Histori observasi: ?city=&from=&to= (unix timestamp atau ISO 8601), default 24 jam terakhir."""
+    body, status = _history_response(request.args)
+    return jsonify(body), status
+
+
+def _history_response(args):
+    """(body, status) /weather/history dari query string (Flask dan asyncio)."""
+    city = args.get("city")
+    if not city:
+        return {"error": "Parameter 'city' wajib diisi"}, 400
+    if not STORE_PATH:
+        return {"error": "Penyimpanan histori tidak aktif"}, 503
+    if not observation_store.enabled:
+        return {"error": f"Penyimpanan histori tidak tersedia (gagal membuka {STORE_PATH})"}, 503
+
+    now = time.time()
+    ts_to = _parse_timestamp(args.get("to"), now)
+    ts_from = _parse_timestamp(args.get("from"), (ts_to or now) - 86400)
+    if ts_from is None or ts_to is None:
+        return {"error": "Parameter 'from'/'to' harus unix timestamp atau tanggal ISO 8601"}, 400
+    try:
+        limit = max(1, min(int(args.get("limit", 1000)), 10000))
+    except ValueError:
+        return {"error": "Parameter 'limit' harus bilangan bulat"}, 400
+
+    try:
+        rows = observation_store.history(cache_key_for(city), ts_from, ts_to, limit)
+    except sqlite3.Error as e:
+        print(f"Error reading observation history: {e}")
+        return {"error": "Penyimpanan histori tidak tersedia"}, 503
+    return {
+        "city": city,
+        "from": ts_from,
+        "to": ts_to,
+        "count": len(rows),
+        "observations": [
+            {"timestamp": observed_at,
+             "observed_at": datetime.datetime.fromtimestamp(observed_at, datetime.timezone.utc).isoformat(),
+             "data": observation}
+            for observed_at, observation in rows
+        ],
+    }, 200
+
+
+def collect_stats():
+    """Counter internal semua komponen (dipakai /stats dan /metrics)."""
+    return {
+        "cache": weather_cache.stats(),
+        "single_flight": upstream_flight.stats(),
+        "upstream": upstream_client.stats(),
+        "limiter": upstream_limiter.stats(),
+        "hedge": upstream_hedger.stats(),
+        "breaker": upstream_breaker.stats(),
+        "store": observation_store.stats(),
+        "refresh": refresh_scheduler.stats(),
+        "shared_cache": shared_cache.stats(),
+        "negative_cache": negative_cache.stats(),
+        "city_index": city_index.stats(),
+        "stream": update_hub.stats(),
+    }
+
+
+@app.route("/stats")
+def stats_api():
+    """Counter internal (hit/miss/eviksi cache) untuk sizing."""
+    return jsonify(collect_stats()), 200
+
+
+@app.route("/metrics")
+def metrics_api():
+    """Metric format teks Prometheus: latensi per tahap, status code, error upstream, in-flight."""
+    return Response(metrics.render(collect_stats()), mimetype="text/plain; version=0.0.4")
+
+
+@app.before_request
+def _metrics_before_request():
+    g.request_start = time.perf_counter()
+    metrics.request_started()
+
+
+@app.after_request
+def _metrics_after_request(response):
+    start = g.pop("request_start", None)
+    if start is not None:
+        metrics.observe_request(request.endpoint or "unknown", response.status_code, time.perf_counter() - start)
+    return response
+
+
+@app.teardown_request
+def _metrics_teardown_request(error=None):
+    metrics.request_finished()
 
 
-# Jika tidak ada API Key dari environment (dan tidak pakai opsi langsung), tampilkan pesan error dan keluar
-if not API_KEY:
-    print("Error: OPENWEATHERMAP_API_KEY environment variable not set.")
-    print("Please set it before running the script.")
-    print("Example (Linux/macOS): export OPENWEATHERMAP_API_KEY='your_api_key'")
-    print("Example (Windows Command Prompt): set OPENWEATHERMAP_API_KEY=your_api_key")
-    print("Example (Windows PowerShell): $env:OPENWEATHERMAP_API_KEY='your_api_key'")
-    sys.exit(1)  # Keluar dari program jika API Key tidak ada
+def start_api_server(host=API_HOST, port=API_PORT):
+    """Bind socket server API lalu layani request di thread daemon.
 
+    Saat fungsi ini kembali socket sudah listening, jadi pemanggil bisa
+    langsung mengirim request tanpa menunggu (pengganti time.sleep).
+    """
+    start_background_services()
+    server = make_server(host, port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="api-server", daemon=True).start()
+    print(f"API berjalan di http://{host}:{server.server_port}")
+    return server
 
-# Pengaturan URL API OpenWeatherMap
-BASE_OWM_API_URL = "http://api.openweathermap.org/data/2.5/"
-BASE_OWM_ICON_URL = "http://openweathermap.org/img/wn/"
 
-# --- Definisi Tema Warna (Modern & Menarik - Mengambil Inspirasi dari Gambar) ---
-THEME = {
-    "primary_bg": "#1a237e",       # Sangat gelap biru/ungu (latar belakang utama)
-    "secondary_bg": "#303f9f",     # Lebih terang biru/ungu (latar belakang container info cuaca)
-    "card_bg": "#3949ab",          # Medium biru/ungu (latar belakang kartu detail)
-    "text_primary": "#ffffff",     # Putih (teks utama, judul, label)
-    "text_secondary": "#bbdefb",   # Biru muda (deskripsi, beberapa label)
-    "accent_temp": "#ffeb3b",      # Kuning cerah (suhu utama)
-    "accent_detail_value": "#ffeb3b", # Kuning cerah (nilai detail)
-    "accent_icon": "#ffeb3b",      # Kuning cerah (ikon aplikasi, beberapa ikon detail)
-    "button_bg": "#ffca28",        # Kuning (latar belakang tombol)
-    "button_fg": "#1a237e",        # Warna teks tombol (sesuai primary_bg)
-    "entry_bg": "#e0e0e0",         # Abu-abu terang (latar belakang input)
-    "entry_fg": "#1a237e",         # Warna teks input (sesuai primary_bg)
-    "entry_insert": "gray",        # Warna kursor
-    "error_fg": "#ff8a65",         # Oranye terang (pesan error)
-    "footer_fg": "#e0e0e0",        # Abu-abu terang (teks footer)
-}
+def run_api(host=API_HOST, port=API_PORT):
+    start_background_services()
+    server = make_server(host, port, app, threaded=True)
+    print(f"API berjalan di http://{host}:{server.server_port}")
+    server.serve_forever()
 
 
-# --- Flask API Server ---
-# Kode Flask server tetap sama
-app = Flask(__name__)
+# --- Mode Production Multi-Proses (Pre-Fork) ---
+
+def _serve_worker(listen_socket, host, port, index, workers):
+    """Loop satu worker pre-fork: layani request di socket bersama sampai menerima SIGTERM."""
+    if workers > 1:
+        upstream_limiter.share(shared_cache)  # satu token bucket untuk seluruh cluster
+    init_observation_store()
+    if REFRESH_ENABLED and index == 0:
+        refresh_scheduler.start()  # satu scheduler per cluster supaya refresh tidak berlipat
+    server = make_server(host, port, app, threaded=True, fd=listen_socket.fileno())
+    # Thread request non-daemon: server_close() menunggu request yang sedang berjalan selesai
+    server.daemon_threads = False
+    # Semua worker di-wake oleh select() untuk koneksi yang sama; yang kalah harus mendapat
+    # EAGAIN dari accept(), bukan terblokir (worker yang terblokir tidak bisa shutdown)
+    server.socket.setblocking(False)
+
+    def _drain():
+        update_hub.close()  # stream terbuka tidak menahan drain worker
+        server.shutdown()
+
+    def _shutdown(signum, frame):
+        # Tanpa lock di signal handler: handler bisa dipanggil ulang di tengah dirinya sendiri
+        threading.Thread(target=_drain, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, _shutdown)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C ditangani master
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    server.serve_forever()
+    server.server_close()
+    observation_store.flush()
+
+
+def _stop_worker(pid, timeout=WORKER_SHUTDOWN_TIMEOUT):
+    """Kirim SIGTERM lalu tunggu worker selesai; SIGKILL jika melewati ``timeout``."""
+    try:
+        os.kill(pid, signal.SIGTERM)
+    except ProcessLookupError:
+        return
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            done, _ = os.waitpid(pid, os.WNOHANG)
+        except ChildProcessError:
+            return
+        if done:
+            return
+        time.sleep(0.1)
+    print(f"Worker pid {pid} tidak berhenti dalam {timeout} detik, dihentikan paksa")
+    os.kill(pid, signal.SIGKILL)
+    os.waitpid(pid, 0)
+
+
+def run_api_workers(host=API_HOST, port=API_PORT, workers=WORKERS):
+    """Jalankan API production: ``workers`` proses pre-fork pada satu port dengan cache bersama.
+
+    Master hanya memegang socket listening dan mengawasi worker: worker yang mati
+    dijalankan ulang, SIGHUP me-restart worker satu per satu (rolling, port tetap
+    terbuka), SIGTERM/SIGINT menghentikan semua worker secara graceful.
+    """
+    if not hasattr(os, "fork"):
+        print("Error: mode multi-proses membutuhkan os.fork (Linux/macOS). Gunakan --api-only.")
+        sys.exit(1)
+    workers = max(1, workers)
+    shared_cache.open()
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    listen_socket = socket.create_server((host, port), family=family, backlog=128)
+    port = listen_socket.getsockname()[1]
+
+    children = {}  # pid -> indeks worker
+    stopping = threading.Event()
+    restart_requested = threading.Event()
+
+    def spawn(index):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                _serve_worker(listen_socket, host, port, index, workers)
+            except BaseException as e:
+                print(f"Worker {index} error: {e}")
+                code = 1
+            finally:
+                sys.stdout.flush()
+                os._exit(code)
+        children[pid] = index
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stopping.set())
+    signal.signal(signal.SIGHUP, lambda signum, frame: restart_requested.set())
+
+    for index in range(workers):
+        spawn(index)
+    print(f"API berjalan di http://{host}:{port} dengan {workers} worker (master pid {os.getpid()})")
+
+    try:
+        while not stopping.is_set():
+            if restart_requested.is_set():
+                restart_requested.clear()
+                print("Restart worker satu per satu...")
+                for pid, index in list(children.items()):
+                    spawn(index)
+                    _stop_worker(pid)
+                    children.pop(pid, None)
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                pid = 0
+            if pid in children:
+                index = children.pop(pid)
+                print(f"Worker {index} (pid {pid}) berhenti, dijalankan ulang")
+                spawn(index)
+            elif not pid:
+                stopping.wait(0.2)
+    finally:
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)  # semua worker berhenti menerima request bersamaan
+            except ProcessLookupError:
+                pass
+        for pid in list(children):
+            _stop_worker(pid)
+        listen_socket.close()
+        shared_cache.close()
+
+
+# --- Mode Serving Asyncio (aiohttp, opsional) ---
+# Kontrak /weather, /weather/batch, /cities/suggest, /weather/history, /stats dan /metrics
+# sama dengan versi Flask (helper parsing, transform, dan pemetaan error dipakai bersama).
+# Lookup /weather ke OWM non-blocking sehingga ribuan request yang menunggu upstream cukup
+# dilayani satu event loop; batch dan histori berjalan di thread pool. Tidak didukung:
+# /weather/stream (501) dan hedged request.
+# Butuh: pip install aiohttp
+
+async def fetch_weather_from_owm_async(session, city, priority=PRIORITY_INTERACTIVE, limiter_executor=None):
+    """Versi async dari fetch_weather_from_owm: hanya I/O-nya yang berbeda, parsing dan pemetaan error sama."""
+    import aiohttp
 
-def fetch_weather_from_owm(city):
     url = f"{BASE_OWM_API_URL}weather"
-    params = {
-        "q": city,
-        "appid": API_KEY,
-        "units": "metric",
-        "lang": "id"
-    }
+    params = _owm_weather_params(city)
     try:
-        res = requests.get(url, params=params, timeout=10)
-        res.raise_for_status()
-        data = res.json()
-
-        timezone_offset = data.get('timezone', 0)
-        sunrise_utc = datetime.datetime.utcfromtimestamp(data['sys']['sunrise'])
-        sunset_utc = datetime.datetime.utcfromtimestamp(data['sys']['sunset'])
-        sunrise_local = sunrise_utc + datetime.timedelta(seconds=timezone_offset)
-        sunset_local = sunset_utc + datetime.timedelta(seconds=timezone_offset)
-
-        weather = {
-            "city": f"{data['name']}, {data['sys']['country']}",
-            "temp": data['main']['temp'],
-            "description": data['weather'][0]['description'].capitalize(),
-            "humidity": data['main']['humidity'],
-            "wind_speed": data['wind']['speed'],
-            "pressure": data['main']['pressure'],
-            "visibility": round(data.get('visibility', 0) / 1000, 1),
-            "sunrise": sunrise_local.strftime('%H:%M'),
-            "sunset": sunset_local.strftime('%H:%M'),
-            "clouds": data['clouds']['all'],
-            "icon": data['weather'][0]['icon'],
-            "feels_like": data['main']['feels_like']
-        }
-        return weather
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching weather from OWM: {e}")
-        if isinstance(e, requests.exceptions.HTTPError):
-             return {"error": f"HTTP Error: {e.response.status_code} - {e.response.reason}"}
-        elif isinstance(e, requests.exceptions.ConnectionError):
-             return {"error": "Connection Error. Please check your internet."}
-        elif isinstance(e, requests.exceptions.Timeout):
-             return {"error": "Request Timeout."}
+        if not upstream_breaker.allow():
+            return _circuit_open_result()
+        if not upstream_limiter.try_acquire(priority):
+            # Harus antre: tunggu di thread pool khusus (bukan pool default yang dipakai batch/histori)
+            # supaya event loop tidak terblokir dan max_wait limiter langsung mulai dihitung
+            await asyncio.get_running_loop().run_in_executor(limiter_executor, upstream_limiter.acquire, priority)
+        start = time.perf_counter()
+        async with session.get(url, params=params) as res:
+            _record_upstream_status(res.status)
+            if res.status >= 400:
+                return _upstream_status_error(res.status, res.reason, _retry_after_seconds(res))
+            body = await res.read()
+        metrics.observe_stage("upstream", time.perf_counter() - start)
+        return _weather_from_owm_body(city, body)
+    except UpstreamBusy as e:
+        return _upstream_busy(e)
+    except (asyncio.TimeoutError, aiohttp.ServerTimeoutError) as e:
+        # Harus sebelum ClientConnectionError: timeout aiohttp adalah subclass-nya
+        return _upstream_error("timeout", e)
+    except aiohttp.ClientConnectionError as e:
+        return _upstream_error("connection_error", e)
+    except aiohttp.ClientError as e:
+        return _upstream_error("network_error", e)
+    except (KeyError, IndexError, TypeError, ValueError) as e:
+        return _upstream_error("invalid_data", e)
+    except Exception as e:
+        return _upstream_error("unexpected", e)
+
+
+class AsyncWeatherService:
+    """Cache + single-flight + batas konkurensi untuk mode asyncio.
+
+    Memakai weather_cache yang sama dengan mode Flask. Request di atas
+    ``max_concurrency`` menunggu giliran; jika antrean sudah ``max_waiting``,
+    request langsung ditolak dengan 503 (back-pressure).
+    """
+
+    def __init__(self, max_concurrency=ASYNC_MAX_CONCURRENCY, max_waiting=ASYNC_MAX_WAITING):
+        self.max_concurrency = max_concurrency
+        self.max_waiting = max_waiting
+        self.session = None
+        self._semaphore = None
+        # Satu thread per waiter limiter: antrean limiter sendiri yang membatasi (UPSTREAM_QUEUE_SIZE)
+        self._limiter_executor = ThreadPoolExecutor(max_workers=UPSTREAM_QUEUE_SIZE + 1,
+                                                    thread_name_prefix="async-limiter")
+        self._flights = {}
+        self._background = set()
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    async def start(self, app=None):
+        import aiohttp
+
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        connector = aiohttp.TCPConnector(limit=ASYNC_UPSTREAM_CONNECTIONS,
+                                         limit_per_host=ASYNC_UPSTREAM_CONNECTIONS)
+        timeout = aiohttp.ClientTimeout(sock_connect=UPSTREAM_CONNECT_TIMEOUT, sock_read=UPSTREAM_READ_TIMEOUT)
+        self.session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+    async def close(self, app=None):
+        if self.session is not None:
+            await self.session.close()
+        self._limiter_executor.shutdown(wait=False)
+
+    async def _fetch_and_store(self, key, city, priority=PRIORITY_INTERACTIVE):
+        rejected = _rejected_city(key, city)
+        if rejected is not None:
+            return rejected
+        result = await fetch_weather_from_owm_async(self.session, _upstream_query(city), priority,
+                                                    self._limiter_executor)
+        return _store_fetch_result(key, result)
+
+    async def fetch_coalesced(self, key, city, priority=PRIORITY_INTERACTIVE):
+        """Single-flight versi asyncio: satu task per key, pemanggil lain menunggu task yang sama."""
+        task = self._flights.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_and_store(key, city, priority))
+            self._flights[key] = task
+            task.add_done_callback(lambda _: self._flights.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _refresh(self, key, city):
+        try:
+            await self.fetch_coalesced(key, city, PRIORITY_BACKGROUND)
+        finally:
+            weather_cache.end_refresh(key)
+
+    async def get_weather(self, city):
+        key = cache_key_for(city)
+        refresh_scheduler.record_request(key, city)
+        cached, is_stale = weather_cache.get(key)
+        if cached is not None:
+            if is_stale and weather_cache.begin_refresh(key):
+                task = asyncio.ensure_future(self._refresh(key, city))
+                self._background.add(task)
+                task.add_done_callback(self._background.discard)
+            return cached
+        return await self.fetch_coalesced(key, city)
+
+    async def handle_weather(self, request):
+        from aiohttp import web
+
+        city, error = _parse_weather_query(request.query)
+        if error:
+            return web.json_response({"error": error}, status=400)
+
+        if self._semaphore.locked() and self.waiting >= self.max_waiting:
+            self.rejected += 1
+            return web.json_response({"error": "Server sibuk, coba lagi."}, status=503,
+                                     headers={"Retry-After": "1"})
+
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        try:
+            result = await self.get_weather(city)
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+        if "error" in result:
+            body, status = _error_response(result)
+            return web.json_response(body, status=status, headers=_error_headers(body))
+        with metrics.time_stage("serialize"):
+            encoded = weather_cache.encoded(cache_key_for(city), result)
+        status, body, headers = encoded.negotiate(request.headers.get("If-None-Match"),
+                                                  request.headers.get("Accept-Encoding"))
+        return web.Response(body=body, status=status, headers=headers,
+                            content_type="application/json" if status == 200 else None)
+
+    async def handle_batch(self, request):
+        """/weather/batch: logika sama dengan Flask, dijalankan di thread pool (client upstream sinkron)."""
+        from aiohttp import web
+
+        body = None
+        if request.method == "POST" and request.can_read_body:
+            try:
+                body = await request.json()
+            except ValueError:
+                body = None  # sama seperti get_json(silent=True) di Flask
+        cities = _parse_cities(request.query.getall("city", []), request.query.getall("cities", []), body)
+        result, status = await asyncio.get_running_loop().run_in_executor(None, _batch_response, cities)
+        return web.json_response(result, status=status)
+
+    async def handle_suggest(self, request):
+        from aiohttp import web
+
+        body, status = _suggest_response(request.query)
+        return web.json_response(body, status=status)
+
+    async def handle_history(self, request):
+        from aiohttp import web
+
+        body, status = await asyncio.get_running_loop().run_in_executor(None, _history_response, request.query)
+        return web.json_response(body, status=status)
+
+    async def handle_stream(self, request):
+        from aiohttp import web
+
+        return web.json_response({"error": "/weather/stream tidak tersedia di mode asyncio; gunakan server Flask."},
+                                 status=501)
+
+    def stats(self):
+        return dict(collect_stats(), **{
+            "async": {
+                "in_flight": self.in_flight,
+                "waiting": self.waiting,
+                "rejected": self.rejected,
+                "max_concurrency": self.max_concurrency,
+            },
+        })
+
+    async def handle_stats(self, request):
+        from aiohttp import web
+
+        return web.json_response(self.stats())
+
+    async def handle_metrics(self, request):
+        from aiohttp import web
+
+        return web.Response(text=metrics.render(self.stats()), content_type="text/plain")
+
+
+def create_async_app(service=None):
+    """Buat aplikasi aiohttp dengan route yang sama dengan versi Flask (kecuali /weather/stream).
+
+    Nama route sama dengan nama endpoint Flask supaya label metric per endpoint konsisten.
+    """
+    from aiohttp import web
+
+    @web.middleware
+    async def metrics_middleware(request, handler):
+        metrics.request_started()
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = await handler(request)
+            status = response.status
+            return response
+        except web.HTTPException as e:
+            status = e.status
+            raise
+        finally:
+            route = request.match_info.route
+            metrics.observe_request(route.name or "unknown", status, time.perf_counter() - start)
+            metrics.request_finished()
+
+    service = service or AsyncWeatherService()
+    aio_app = web.Application(middlewares=[metrics_middleware])
+    aio_app.on_startup.append(service.start)
+    aio_app.on_cleanup.append(service.close)
+    aio_app.router.add_get("/weather", service.handle_weather, name="weather_api")
+    batch = aio_app.router.add_resource("/weather/batch", name="weather_batch_api")
+    batch.add_route("GET", service.handle_batch)
+    batch.add_route("POST", service.handle_batch)
+    aio_app.router.add_get("/weather/stream", service.handle_stream, name="weather_stream_api")
+    aio_app.router.add_get("/cities/suggest", service.handle_suggest, name="cities_suggest_api")
+    aio_app.router.add_get("/weather/history", service.handle_history, name="weather_history_api")
+    aio_app.router.add_get("/stats", service.handle_stats, name="stats_api")
+    aio_app.router.add_get("/metrics", service.handle_metrics, name="metrics_api")
+    return aio_app
+
+
+def run_api_async(host=API_HOST, port=API_PORT):
+    """Jalankan API dalam mode asyncio (pengganti run_api untuk beban I/O tinggi)."""
+    try:
+        from aiohttp import web
+    except ImportError:
+        print("Error: mode asyncio membutuhkan aiohttp. Install dengan: pip install aiohttp")
+        sys.exit(1)
+    start_background_services()
+    web.run_app(create_async_app(), host=host, port=port)
+
+
+# --- Sumber Data GUI (In-Process / Remote HTTP) ---
+
+class WeatherSourceError(Exception):
+    """Error dari sumber data cuaca; pesannya siap ditampilkan di GUI."""
+
+
+class InProcessWeatherSource:
+    """Memanggil lapisan cache/fetch di proses yang sama, tanpa loopback HTTP."""
+
+    def get_weather(self, city):
+        result = get_weather(city)
+        if "error" in result:
+            body, _ = _error_response(result)
+            raise WeatherSourceError(body["error"])
+        return result
+
+    def stream_updates(self, cities, stop):
+        """Yield entri per kota (format /weather/stream): snapshot, lalu setiap observasi baru sampai ``stop`` di-set."""
+        subscription = update_hub.subscribe_cities(cities)
+        if subscription is None:
+            raise WeatherSourceError("Terlalu banyak klien streaming, coba lagi nanti.")
+        try:
+            yield from update_hub.snapshot(subscription)
+            while not stop.is_set():
+                update = subscription.get(timeout=1.0)
+                if update is not None:
+                    key, value = update
+                    yield _city_entry(subscription.keys[key], value)
+        finally:
+            update_hub.unsubscribe(subscription)
+
+
+class RemoteWeatherSource:
+    """Memanggil endpoint /weather pada server API yang di-deploy terpisah."""
+
+    def __init__(self, base_url=WEATHER_API_URL, timeout=15):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def get_weather(self, city):
+        res = self.session.get(f"{self.base_url}/weather", params={"city": city}, timeout=self.timeout)
+        if res.status_code != 200:
+            try:
+                error_message = res.json().get("error")
+            except ValueError:
+                error_message = None
+            raise WeatherSourceError(error_message or f"API Error (Status: {res.status_code})")
+        return res.json()
+
+    def stream_updates(self, cities, stop):
+        """Konsumsi /weather/stream (NDJSON) lewat satu koneksi panjang; yield entri per kota."""
+        # Koneksi sendiri (bukan self.session) karena berjalan di thread live terpisah
+        res = requests.get(f"{self.base_url}/weather/stream", params={"city": list(cities), "format": "ndjson"},
+                           stream=True, timeout=(self.timeout, STREAM_KEEPALIVE_SECONDS * 2))
+        with res:
+            if res.status_code != 200:
+                raise WeatherSourceError(f"Stream Error (Status: {res.status_code})")
+            for line in res.iter_lines():
+                if stop.is_set():
+                    return
+                if line:  # baris kosong = keepalive
+                    yield json.loads(line)
+
+
+def create_weather_source(mode=GUI_DATA_SOURCE, base_url=WEATHER_API_URL):
+    """Pilih sumber data GUI berdasarkan mode ("inprocess" atau "remote")."""
+    if mode == "remote":
+        return RemoteWeatherSource(base_url)
+    if mode == "inprocess":
+        return InProcessWeatherSource()
+    raise ValueError(f"Unknown weather source mode: {mode}")
+
+
+# --- Cache Ikon Cuaca (Memori + Disk) ---
+
+class IconCache:
+    """Ikon cuaca yang sudah di-decode dan di-resize, per (kode ikon, ukuran).
+
+    Download, decode, dan resize berjalan di worker thread; hasilnya disimpan
+    di memori dan sebagai PNG di ``cache_dir`` supaya tetap ada setelah restart.
+    """
+
+    def __init__(self, cache_dir=ICON_CACHE_DIR, max_workers=4):
+        self.cache_dir = cache_dir
+        self._images = {}   # (icon_id, size) -> PIL Image
+        self._pending = {}  # (icon_id, size) -> Future
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="icon-loader")
+
+    def _disk_path(self, icon_id, size):
+        return os.path.join(self.cache_dir, f"{icon_id}_{size[0]}x{size[1]}.png")
+
+    def _load(self, icon_id, size):
+        """Baca dari disk cache, atau download + resize dan simpan ke disk (berjalan di worker)."""
+        if not isinstance(icon_id, str) or not ICON_ID_PATTERN.fullmatch(icon_id):
+            # Kode ikon berasal dari respons upstream: jangan sampai jadi path di luar cache_dir
+            raise ValueError(f"Invalid icon id: {icon_id!r}")
+        path = self._disk_path(icon_id, size)
+        try:
+            with Image.open(path) as cached:
+                image = cached.convert("RGBA")
+        except (OSError, ValueError):
+            res = upstream_client.get(f"{BASE_OWM_ICON_URL}{icon_id}@2x.png", read_timeout=5)
+            res.raise_for_status()
+            image = Image.open(io.BytesIO(res.content)).convert("RGBA")
+            image = image.resize(size, Image.Resampling.LANCZOS)
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                image.save(tmp_path, format="PNG")
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"Error writing icon cache {path}: {e}")
+
+        with self._lock:
+            self._images[(icon_id, size)] = image
+        return image
+
+    def get(self, icon_id, size=ICON_SIZE):
+        """Ikon dari memori, atau None jika belum dimuat."""
+        with self._lock:
+            return self._images.get((icon_id, size))
+
+    def load_async(self, icon_id, size=ICON_SIZE):
+        """Mulai memuat ikon di background; mengembalikan Future (satu per ikon yang sedang dimuat)."""
+        load_gui_modules()
+        key = (icon_id, size)
+        with self._lock:
+            future = self._pending.get(key)
+            if future is not None:
+                return future
+            future = self._executor.submit(self._load, icon_id, size)
+            self._pending[key] = future
+        # Didaftarkan di luar lock: jika _load sudah selesai, callback langsung
+        # berjalan di thread ini dan _discard_pending perlu mengambil lock.
+        future.add_done_callback(lambda done: self._discard_pending(key, done))
+        return future
+
+    def _discard_pending(self, key, future):
+        with self._lock:
+            if self._pending.get(key) is future:
+                del self._pending[key]
+
+    def prefetch(self, icon_ids=OWM_ICON_CODES, size=ICON_SIZE):
+        for icon_id in icon_ids:
+            if self.get(icon_id, size) is None:
+                self.load_async(icon_id, size)
+
+
+icon_cache = IconCache()
+
+
+# --- Dasbor Multi-Kota (Tkinter) ---
+
+class CityCard:
+    """Kartu satu kota di dasbor; kartu di-recycle untuk kota lain saat di-scroll.
+
+    Nilai yang terakhir dirender disimpan per field, jadi ``render`` hanya
+    memanggil ``.config`` untuk field yang benar-benar berubah.
+    """
+
+    WIDTH = 260
+    HEIGHT = 140
+
+    def __init__(self, parent, font_family, icon_loader):
+        self.icon_loader = icon_loader
+        self.visible = False
+        self._shown = {}
+        self.frame = tk.Frame(parent, bg=THEME["card_bg"], width=self.WIDTH, height=self.HEIGHT, padx=10, pady=8)
+        self.frame.grid_propagate(False)
+        self.frame.columnconfigure(1, weight=1)
+
+        self.name_lbl = tk.Label(self.frame, text="", font=(font_family, 13, "bold"), anchor="w",
+                                 bg=THEME["card_bg"], fg=THEME["text_primary"])
+        self.name_lbl.grid(row=0, column=0, columnspan=2, sticky="ew")
+        self.icon_lbl = tk.Label(self.frame, bg=THEME["card_bg"])
+        self.icon_lbl.grid(row=1, column=0, rowspan=2, sticky="w")
+        self.temp_lbl = tk.Label(self.frame, text="--°C", font=(font_family, 26, "bold"), anchor="w",
+                                 bg=THEME["card_bg"], fg=THEME["accent_temp"])
+        self.temp_lbl.grid(row=1, column=1, sticky="ew")
+        self.desc_lbl = tk.Label(self.frame, text="", font=(font_family, 11), anchor="w",
+                                 bg=THEME["card_bg"], fg=THEME["text_secondary"])
+        self.desc_lbl.grid(row=2, column=1, sticky="ew")
+        self.detail_lbl = tk.Label(self.frame, text="", font=(font_family, 10), anchor="w",
+                                   bg=THEME["card_bg"], fg=THEME["text_primary"])
+        self.detail_lbl.grid(row=3, column=0, columnspan=2, sticky="ew")
+        self.clouds_progress = ttk.Progressbar(self.frame, orient='horizontal', mode='determinate')
+        self.clouds_progress.grid(row=4, column=0, columnspan=2, sticky="ew", pady=(4, 0))
+
+    def _set(self, field, widget, value, option="text"):
+        if field in self._shown and (self._shown[field] is value or self._shown[field] == value):
+            return
+        self._shown[field] = value
+        if option == "value":
+            widget["value"] = value
         else:
-             return {"error": f"Network Error: {e}"}
+            widget.config(**{option: value})
 
-    except KeyError as e:
-        print(f"Error parsing OWM weather data (missing key): {e}")
-        return {"error": "Invalid data format from API."}
-    except Exception as e:
-        print(f"An unexpected error occurred during fetch: {e}")
-        return {"error": f"An unexpected error occurred: {e}"}
+    def show(self, row, column):
+        if not self.visible:
+            self.frame.grid(row=row, column=column, padx=4, pady=4)
+            self.visible = True
 
+    def hide(self):
+        if self.visible:
+            self.frame.grid_remove()
+            self.visible = False
 
-@app.route("/weather")
-def weather_api():
-    city = request.args.get("city")
-    if not city:
-        return jsonify({"error": "Parameter 'city' wajib diisi"}), 400
+    def render(self, city, entry):
+        """Render entri (format /weather/stream) untuk ``city``; entry None = belum ada data."""
+        self._set("name", self.name_lbl, f"📍 {city}")
+        data = entry.get("data") if entry and entry.get("status") == 200 else None
+        if data is None:
+            self._set("temp", self.temp_lbl, "--°C")
+            self._set("desc", self.desc_lbl, entry.get("error", "") if entry else "Memuat...")
+            self._set("desc_fg", self.desc_lbl, THEME["error_fg"] if entry else THEME["text_secondary"], option="fg")
+            self._set("detail", self.detail_lbl, "")
+            self._set("clouds", self.clouds_progress, 0, option="value")
+            self._set("icon", self.icon_lbl, "", option="image")
+            return
 
-    result = fetch_weather_from_owm(city)
+        temp_val = data.get('temp')
+        self._set("temp", self.temp_lbl, f"{int(round(temp_val))}°C" if isinstance(temp_val, (int, float)) else "--°C")
+        self._set("desc", self.desc_lbl, data.get('description', '').capitalize())
+        self._set("desc_fg", self.desc_lbl, THEME["text_secondary"], option="fg")
+        humidity, wind = data.get('humidity'), data.get('wind_speed')
+        self._set("detail", self.detail_lbl,
+                  f"💧 {humidity if humidity is not None else '--'}%   "
+                  f"💨 {f'{wind:.1f}' if isinstance(wind, (int, float)) else '--'} m/s")
+        clouds_val = data.get('clouds')
+        self._set("clouds", self.clouds_progress,
+                  max(0, min(100, clouds_val)) if isinstance(clouds_val, (int, float)) else 0, option="value")
+        photo = self.icon_loader(data.get('icon')) if data.get('icon') else None
+        self._set("icon", self.icon_lbl, photo or "", option="image")
 
-    if "error" in result:
-        if "city not found" in result["error"].lower() or "not found" in result["error"].lower():
-             return jsonify({"error": "Kota tidak ditemukan."}), 404
+
+class WeatherDashboard:
+    """Dasbor banyak kota untuk layar ops: grid kartu kota yang di-virtualisasi.
+
+    Hanya kartu untuk baris yang terlihat yang dibuat; saat di-scroll kartu yang
+    sama dipakai ulang untuk kota lain. Data datang dari stream update di thread
+    background dan ditampung di ``_pending``; satu tick ``root.after`` per frame
+    (``frame_ms``) menerapkan semua update yang terkumpul sekaligus.
+    """
+
+    def __init__(self, root, cities, source=None, frame_ms=DASHBOARD_FRAME_MS):
+        self.root = root
+        self.source = source or create_weather_source()
+        self.cities = list(OrderedDict.fromkeys(cities))
+        self.frame_ms = frame_ms
+        self._index_of = {city: index for index, city in enumerate(self.cities)}
+        self._data = {}      # indeks kota -> entri terakhir (hanya diakses thread UI)
+        self._pending = {}   # indeks kota -> entri yang belum diterapkan (diisi thread stream)
+        self._full_render = False
+        self._flush_scheduled = False
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._cards = []
+        self._cols = 0
+        self._rows_visible = 0
+        self._first_row = 0
+        self._icon_photos = {}
+        self._icons_loading = set()
+        self.updates_applied = 0
+
+        self.FONT_FAMILY = "Poppins" if "Poppins" in tkfont.families() else "Arial"
+        self.root.title("Dasbor Cuaca")
+        self.root.config(bg=THEME["primary_bg"])
+        self.root.geometry("1300x820")
+        ttk.Style(self.root).theme_use('clam')
+
+        self.header_lbl = tk.Label(self.root, text=f"Dasbor Cuaca — {len(self.cities)} kota",
+                                   font=(self.FONT_FAMILY, 18, "bold"), anchor="w",
+                                   bg=THEME["primary_bg"], fg=THEME["text_primary"])
+        self.header_lbl.pack(fill=tk.X, padx=12, pady=(10, 4))
+
+        body = tk.Frame(self.root, bg=THEME["primary_bg"])
+        body.pack(fill=tk.BOTH, expand=True, padx=8, pady=(0, 8))
+        self.scrollbar = tk.Scrollbar(body, orient=tk.VERTICAL, command=self._on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.cards_frame = tk.Frame(body, bg=THEME["primary_bg"])
+        self.cards_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.cards_frame.bind('<Configure>', self._on_resize)
+        self.root.bind('<MouseWheel>', self._on_mousewheel)
+        self.root.bind('<Button-4>', self._on_mousewheel)
+        self.root.bind('<Button-5>', self._on_mousewheel)
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
+
+        for start in range(0, len(self.cities), BATCH_MAX_CITIES):
+            chunk = self.cities[start:start + BATCH_MAX_CITIES]
+            threading.Thread(target=self._consume, args=(chunk,), name="dashboard-stream", daemon=True).start()
+
+    # --- Thread stream ---
+
+    def _consume(self, cities):
+        while not self._stop.is_set():
+            try:
+                for entry in self.source.stream_updates(cities, self._stop):
+                    self._enqueue(entry)
+            except Exception as e:
+                print(f"Error in dashboard stream: {e}")
+            self._stop.wait(5)
+
+    def _enqueue(self, entry):
+        index = self._index_of.get(entry.get("city"))
+        if index is None:
+            return
+        with self._lock:
+            self._pending[index] = entry  # latest wins: update lama untuk kota yang sama dibuang
+        self._request_flush()
+
+    def _request_flush(self, full=False):
+        """Jadwalkan satu flush untuk frame berikutnya (aman dipanggil dari thread mana pun)."""
+        with self._lock:
+            self._full_render = self._full_render or full
+            if self._flush_scheduled:
+                return
+            self._flush_scheduled = True
+        self.root.after(self.frame_ms, self._flush)
+
+    # --- Thread UI ---
+
+    def _flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            full, self._full_render = self._full_render, False
+            self._flush_scheduled = False
+        if self._stop.is_set():
+            return
+        self._data.update(pending)
+        self.updates_applied += len(pending)
+        if full:
+            self._render_visible()
         else:
-             return jsonify(result), 500
+            start = self._first_row * self._cols
+            for index, entry in pending.items():
+                slot = index - start
+                if 0 <= slot < len(self._cards):
+                    self._cards[slot].render(self.cities[index], entry)
+        if pending:
+            self.header_lbl.config(text=f"Dasbor Cuaca — {len(self.cities)} kota · "
+                                        f"update terakhir {time.strftime('%H:%M:%S')}")
 
-    return jsonify(result), 200
+    def _icon_photo(self, icon_id):
+        """PhotoImage ikon kecil, atau None sementara ikon dimuat di background."""
+        photo = self._icon_photos.get(icon_id)
+        if photo is None:
+            image = icon_cache.get(icon_id, DASHBOARD_ICON_SIZE)
+            if image is None:
+                if icon_id not in self._icons_loading:
+                    self._icons_loading.add(icon_id)
+                    future = icon_cache.load_async(icon_id, DASHBOARD_ICON_SIZE)
+                    future.add_done_callback(lambda _: self._request_flush(full=True))
+                return None
+            photo = self._icon_photos[icon_id] = ImageTk.PhotoImage(image)
+        return photo
 
+    def _on_resize(self, event):
+        cols = max(1, event.width // (CityCard.WIDTH + 8))
+        rows_visible = max(1, event.height // (CityCard.HEIGHT + 8))
+        if (cols, rows_visible) == (self._cols, self._rows_visible):
+            return
+        self._cols, self._rows_visible = cols, rows_visible
+        needed = cols * rows_visible
+        while len(self._cards) > needed:
+            self._cards.pop().frame.destroy()
+        while len(self._cards) < needed:
+            self._cards.append(CityCard(self.cards_frame, self.FONT_FAMILY, self._icon_photo))
+        for card in self._cards:
+            card.hide()  # posisi grid berubah mengikuti jumlah kolom baru
+        self._scroll_to(self._first_row, force=True)
+
+    def _total_rows(self):
+        return max(1, math.ceil(len(self.cities) / max(1, self._cols)))
+
+    def _scroll_to(self, first_row, force=False):
+        first_row = max(0, min(first_row, self._total_rows() - self._rows_visible))
+        if first_row != self._first_row or force:
+            self._first_row = first_row
+            self._render_visible()
+        total = self._total_rows()
+        self.scrollbar.set(first_row / total, min(1.0, (first_row + self._rows_visible) / total))
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self._scroll_to(int(round(float(amount) * self._total_rows())))
+        elif action == "scroll":
+            step = int(amount) * (self._rows_visible if unit == "pages" else 1)
+            self._scroll_to(self._first_row + step)
 
-def run_api():
-    app.run(port=5000, debug=False, use_reloader=False)
+    def _on_mousewheel(self, event):
+        self._scroll_to(self._first_row + (-1 if event.num == 4 or event.delta > 0 else 1))
+
+    def _render_visible(self):
+        """Ikat kartu ke kota di baris yang terlihat; render tetap diff per field."""
+        start = self._first_row * self._cols
+        for slot, card in enumerate(self._cards):
+            index = start + slot
+            if index < len(self.cities):
+                card.show(slot // self._cols, slot % self._cols)
+                card.render(self.cities[index], self._data.get(index))
+            else:
+                card.hide()
+
+    def close(self):
+        self._stop.set()
+        self.root.destroy()
 
 
 # --- Tkinter GUI ---
 
 class WeatherApp:
-    def __init__(self, root):
+    def __init__(self, root, source=None):
         self.root = root
+        self.source = source or create_weather_source()
         self.root.title("Penjelajah Cuaca Modern")
         self.root.config(bg=THEME["primary_bg"])
         self.root.geometry("900x650")
@@ -226,6 +3659,38 @@ class WeatherApp:
                                        padx=25, pady=10)
         self.search_button.grid(row=0, column=1, sticky="e")
 
+        # Mode live: update didorong server lewat satu koneksi streaming, bukan klik "Cari" berulang
+        self.live_var = tk.BooleanVar(value=False)
+        self.live_check = tk.Checkbutton(self.input_frame, text="Live", variable=self.live_var,
+                                         command=self.toggle_live_mode, font=self.FONT_EXTRA_INFO,
+                                         bg=THEME["primary_bg"], fg=THEME["text_primary"],
+                                         selectcolor=THEME["secondary_bg"], activebackground=THEME["primary_bg"],
+                                         activeforeground=THEME["text_primary"], bd=0, highlightthickness=0,
+                                         cursor="hand2")
+        self.live_check.grid(row=0, column=2, padx=(15, 0), sticky="e")
+        self._live_city = None
+        self._live_stop = None
+        self._live_loading = False  # sesi live masih menunggu entri pertama (tombol Cari "Loading...")
+
+        # Fetch lewat worker pool terbatas; hanya hasil pencarian terbaru (generation) yang dirender
+        self._fetch_executor = ThreadPoolExecutor(max_workers=GUI_FETCH_WORKERS, thread_name_prefix="gui-fetch")
+        self._generation = 0
+        self._typing_after_id = None
+        self.stale_results_dropped = 0
+
+        # Saran kota dari indeks offline, mengambang di bawah input (anak root supaya tidak terpotong frame)
+        self._suggestions = []
+        self.suggestion_list = tk.Listbox(self.root, height=5, font=self.FONT_EXTRA_INFO, activestyle="none",
+                                          relief=tk.FLAT, bd=0, highlightthickness=0,
+                                          bg=THEME["entry_bg"], fg=THEME["entry_fg"],
+                                          selectbackground=THEME["button_bg"], selectforeground=THEME["button_fg"])
+        self.suggestion_list.bind('<ButtonRelease-1>', lambda event: self.choose_suggestion())
+        self.suggestion_list.bind('<Return>', lambda event: self.choose_suggestion())
+        self.suggestion_list.bind('<Escape>', lambda event: self.hide_suggestions(focus_entry=True))
+        self.search_entry.bind('<KeyRelease>', self.update_suggestions)
+        self.search_entry.bind('<Down>', lambda event: self.focus_suggestions())
+        self.search_entry.bind('<Escape>', lambda event: self.hide_suggestions())
+
 
         # --- Row 2: Frame Hasil Cuaca Utama (Lokasi, Suhu, Ikon, Deskripsi) ---
         self.weather_info_frame = tk.Frame(self.main_frame, bg=THEME["secondary_bg"], padx=20, pady=20)
@@ -322,6 +3787,12 @@ class WeatherApp:
                                    bg=THEME["primary_bg"], fg=THEME["footer_fg"])
         self.footer_lbl.grid(row=8, column=0, pady=(10, 0))
 
+        # Cache PhotoImage per ikon (hanya diakses dari thread utama Tkinter)
+        self._icon_photos = {}
+        self._current_icon_id = None
+        if ICON_PREFETCH:
+            icon_cache.prefetch()
+
 
     def apply_theme(self):
         """Applies the static theme colors to all widgets."""
@@ -381,18 +3852,148 @@ class WeatherApp:
         self.footer_lbl.config(bg=theme["primary_bg"], fg=theme["footer_fg"])
 
 
-    def search_weather(self):
+    def update_suggestions(self, event=None):
+        """Isi daftar saran dari indeks kota offline (cukup cepat untuk dijalankan di thread UI)."""
+        if event is not None and event.keysym in ("Return", "KP_Enter", "Escape", "Up", "Down", "Tab"):
+            return
+        if GUI_SEARCH_AS_YOU_TYPE:
+            self._schedule_typing_search()
+        self._suggestions = [f"{name}, {country}" for name, country in city_index.suggest(self.city_var.get(), 5)]
+        if not self._suggestions:
+            self.hide_suggestions()
+            return
+        self.suggestion_list.delete(0, tk.END)
+        self.suggestion_list.insert(tk.END, *self._suggestions)
+        self.suggestion_list.config(height=len(self._suggestions))
+        self.suggestion_list.place(in_=self.search_entry, relx=0, rely=1, relwidth=1, y=2)
+        self.suggestion_list.lift()
+
+
+    def focus_suggestions(self):
+        """Pindah ke daftar saran (tombol panah bawah di input)."""
+        if not self._suggestions:
+            return
+        self.suggestion_list.focus_set()
+        self.suggestion_list.selection_clear(0, tk.END)
+        self.suggestion_list.selection_set(0)
+        self.suggestion_list.activate(0)
+
+
+    def choose_suggestion(self):
+        selection = self.suggestion_list.curselection()
+        if not selection:
+            return
+        self.city_var.set(self.suggestion_list.get(selection[0]))
+        self.hide_suggestions(focus_entry=True)
+        self.search_weather()
+
+
+    def hide_suggestions(self, focus_entry=False):
+        self._suggestions = []
+        self.suggestion_list.place_forget()
+        if focus_entry:
+            self.search_entry.focus_set()
+            self.search_entry.icursor(tk.END)
+
+
+    def _schedule_typing_search(self):
+        """Debounce pencarian saat mengetik: hanya berjalan setelah input diam selama GUI_SEARCH_DEBOUNCE_MS."""
+        if self._typing_after_id is not None:
+            self.root.after_cancel(self._typing_after_id)
+            self._typing_after_id = None
+        # Hanya nama yang dikenal indeks kota, supaya ketikan setengah jadi tidak memanggil upstream
+        if city_index.resolve(self.city_var.get().strip()) is not None:
+            self._typing_after_id = self.root.after(GUI_SEARCH_DEBOUNCE_MS, self._typing_search)
+
+
+    def _typing_search(self):
+        self._typing_after_id = None
+        self.search_weather(keep_input=True)
+
+
+    def search_weather(self, keep_input=False):
+        """Mulai pencarian; ``keep_input`` untuk pencarian otomatis saat mengetik (input dan saran tidak diubah)."""
+        if not keep_input:
+            self.hide_suggestions()
+            if self._typing_after_id is not None:
+                self.root.after_cancel(self._typing_after_id)
+                self._typing_after_id = None
         city = self.search_entry.get().strip()
         if not city:
+            if keep_input:
+                return
             self.error_message_label.config(text="Error: Masukkan nama kota.", fg=THEME["error_fg"], font=self.FONT_ERROR)
             self.clear_weather_display()
             return
 
         self.error_message_label.config(text="")
         self.set_loading_state(True)
-        self.clear_weather_display()
+        self.clear_weather_display(clear_input=not keep_input)
+
+        self._live_city = city
+        self._generation += 1  # hasil pencarian sebelumnya yang belum selesai akan dibuang
+        if self.live_var.get():
+            self.start_live(city, loading=True)  # snapshot pertama dari stream menggantikan fetch sekali jalan
+            return
+        self._fetch_executor.submit(self.get_and_display_weather, city, self._generation, keep_input)
+
+
+    def toggle_live_mode(self):
+        if self.live_var.get() and self._live_city:
+            self.start_live(self._live_city)
+        elif not self.live_var.get():
+            self.stop_live()
+
+
+    def start_live(self, city, loading=False):
+        """Mulai (atau ganti) sesi live untuk satu kota; stream dikonsumsi di thread background.
+
+        ``loading`` jika sesi ini menggantikan pencarian: tombol Cari tetap "Loading..." sampai entri pertama.
+        """
+        self.stop_live()
+        if loading:
+            self._live_loading = True
+            self.set_loading_state(True)
+        stop = self._live_stop = threading.Event()
+        threading.Thread(target=self._consume_live, args=(city, stop), name="weather-live", daemon=True).start()
+
+
+    def stop_live(self):
+        if self._live_stop is not None:
+            self._live_stop.set()
+            self._live_stop = None
+        if self._live_loading:
+            # Entri pertama tidak akan pernah diterapkan: jangan biarkan tombol tertahan di "Loading..."
+            self._live_loading = False
+            self.set_loading_state(False)
+
+
+    def _consume_live(self, city, stop):
+        """Thread live: teruskan setiap entri stream ke thread UI; sambung ulang jika koneksi putus."""
+        while not stop.is_set():
+            try:
+                for entry in self.source.stream_updates([city], stop):
+                    if stop.is_set():
+                        return
+                    self.root.after(0, self._apply_live_entry, stop, entry)
+            except Exception as e:
+                print(f"Error in live stream: {e}")
+                error_text = str(e)
+                self.root.after(0, self._apply_live_entry, stop, {"status": 0, "error": f"Live terputus: {error_text}"})
+            stop.wait(5)
 
-        threading.Thread(target=self.get_and_display_weather, args=(city,), daemon=True).start()
+
+    def _apply_live_entry(self, stop, entry):
+        """Terapkan satu entri stream (thread UI); entri dari sesi live lama diabaikan."""
+        if stop is not self._live_stop:
+            return
+        self._live_loading = False
+        self.set_loading_state(False)
+        if entry.get("status") == 200:
+            self.error_message_label.config(text="")
+            self.update_weather_display(entry["data"])
+        else:
+            self.error_message_label.config(text=f"Error: {entry.get('error')}", fg=THEME["error_fg"], font=self.FONT_ERROR)
 
 
     def set_loading_state(self, loading):
@@ -403,27 +4004,35 @@ class WeatherApp:
             self.search_button.config(text="Cari", state=tk.NORMAL)
 
 
-    def get_and_display_weather(self, city):
-        """Memanggil API Flask dan mengupdate GUI (dalam thread terpisah)."""
-        try:
-            url = f"http://127.0.0.1:5000/weather?city={city}"
-            res = requests.get(url, timeout=15)
-
-            if res.status_code != 200:
-                 error_data = res.json()
-                 error_message = error_data.get("error", f"API Error (Status: {res.status_code})")
-                 raise Exception(error_message)
+    def get_and_display_weather(self, city, generation=None, keep_input=False):
+        """Mengambil data dari sumber data (in-process/remote) di worker pool, lalu mengupdate GUI lewat root.after.
 
-            data = res.json()
-            self.root.after(0, self.update_weather_display, data)
+        Pencarian yang sudah digantikan pencarian lebih baru sebelum sempat berjalan
+        dilewati tanpa memanggil sumber data sama sekali.
+        """
+        if generation is not None and generation != self._generation:
+            self.stale_results_dropped += 1
+            return
+        try:
+            data = self.source.get_weather(city)
+            self.root.after(0, self._apply_result, generation, data, None, keep_input)
 
         except Exception as e:
             print(f"Error in get_and_display_weather: {e}")
-            error_text = str(e)
-            self.root.after(0, lambda: self.error_message_label.config(text=f"Error: {error_text}", fg=THEME["error_fg"], font=self.FONT_ERROR))
-            self.root.after(0, lambda: self.clear_weather_display())
-        finally:
-            self.root.after(0, lambda: self.set_loading_state(False))
+            self.root.after(0, self._apply_result, generation, None, str(e), keep_input)
+
+
+    def _apply_result(self, generation, data, error_text, keep_input=False):
+        """Render hasil fetch (thread UI); hasil dari pencarian lama dibuang sebelum menyentuh widget."""
+        if generation is not None and generation != self._generation:
+            self.stale_results_dropped += 1
+            return
+        self.set_loading_state(False)
+        if error_text is None:
+            self.update_weather_display(data)
+        else:
+            self.error_message_label.config(text=f"Error: {error_text}", fg=THEME["error_fg"], font=self.FONT_ERROR)
+            self.clear_weather_display(clear_input=not keep_input)
 
 
     def update_weather_display(self, data: dict):
@@ -476,34 +4085,48 @@ class WeatherApp:
 
 
     def load_weather_icon(self, icon_id: str):
-        """Fetches and displays the weather icon (should ideally run in separate thread)."""
-        if icon_id:
-            icon_url = f"{BASE_OWM_ICON_URL}{icon_id}@2x.png"
-            try:
-                res = requests.get(icon_url, timeout=5)
-                res.raise_for_status()
-                img_data = res.content
-                image = Image.open(io.BytesIO(img_data))
-                image = image.resize((100, 100), Image.Resampling.LANCZOS)
-                photo = ImageTk.PhotoImage(image)
-                self.icon_lbl.config(image=photo, text="")
-                self.icon_lbl.image = photo
-            except Exception as e:
-                 print(f"Error loading icon {icon_id}: {e}")
-                 self.icon_lbl.config(image="", text="Icon\nN/A", font=(self.FONT_FAMILY, 12),
-                                      bg=THEME["secondary_bg"], fg=THEME["text_primary"])
-                 self.icon_lbl.image = None
+        """Displays the weather icon; missing icons are loaded by icon_cache off the UI thread."""
+        self._current_icon_id = icon_id
+        if not icon_id:
+            self.show_icon_placeholder()
+            return
 
+        photo = self._icon_photos.get(icon_id)
+        if photo is None:
+            image = icon_cache.get(icon_id, ICON_SIZE)
+            if image is None:
+                self.show_icon_placeholder()
+                future = icon_cache.load_async(icon_id, ICON_SIZE)
+                future.add_done_callback(lambda f: self.root.after(0, self._on_icon_loaded, icon_id, f))
+                return
+            photo = self._icon_photos[icon_id] = ImageTk.PhotoImage(image)
 
-        else:
-            self.icon_lbl.config(image="", text="Icon\nN/A", font=(self.FONT_FAMILY, 12),
-                                 bg=THEME["secondary_bg"], fg=THEME["text_primary"])
-            self.icon_lbl.image = None
+        self.icon_lbl.config(image=photo, text="")
+        self.icon_lbl.image = photo
+
+
+    def _on_icon_loaded(self, icon_id, future):
+        """Callback di thread utama setelah ikon selesai dimuat di background."""
+        if icon_id != self._current_icon_id:
+            return  # Ikon sudah tidak relevan (pencarian lain)
+        error = future.exception()
+        if error is not None:
+            print(f"Error loading icon {icon_id}: {error}")
+            self.show_icon_placeholder()
+            return
+        self.load_weather_icon(icon_id)
+
+
+    def show_icon_placeholder(self):
+        self.icon_lbl.config(image="", text="Icon\nN/A", font=(self.FONT_FAMILY, 12),
+                             bg=THEME["secondary_bg"], fg=THEME["text_primary"])
+        self.icon_lbl.image = None
 
 
-    def clear_weather_display(self):
-        """Clears the weather display widgets."""
-        self.city_var.set("")
+    def clear_weather_display(self, clear_input=True):
+        """Clears the weather display widgets (and the city entry unless ``clear_input`` is False)."""
+        if clear_input:
+            self.city_var.set("")
 
         self.location_lbl.config(text="")
         self.temp_lbl.config(text="--°C")
@@ -526,18 +4149,60 @@ class WeatherApp:
         self.cloud_label.config(text="☁️ Keadaan Berawan: --%")
         self.clouds_progress['value'] = 0
 
-        self.icon_lbl.config(image="", text="Icon\nN/A", font=(self.FONT_FAMILY, 12),
-                             bg=THEME["secondary_bg"], fg=THEME["text_primary"])
-        self.icon_lbl.image = None
+        self._current_icon_id = None
+        self.show_icon_placeholder()
 
 
 # --- Jalankan Flask dan GUI bersamaan ---
 if __name__ == "__main__":
-    api_thread = threading.Thread(target=run_api, daemon=True)
-    api_thread.start()
+    parser = argparse.ArgumentParser(description="Penjelajah Cuaca: Flask API + GUI Tkinter")
+    parser.add_argument("--api-only", action="store_true",
+                        help="Jalankan hanya API Flask tanpa GUI (tidak meng-import tkinter/PIL)")
+    parser.add_argument("--async-api", action="store_true",
+                        help="Jalankan hanya API dalam mode asyncio (butuh aiohttp), tanpa GUI")
+    parser.add_argument("--workers", type=int, nargs="?", const=WORKERS, default=None,
+                        help="Jalankan hanya API production dengan N worker pre-fork dan cache bersama "
+                             "(default N: env WEATHER_WORKERS atau jumlah CPU), tanpa GUI")
+    parser.add_argument("--dashboard", nargs="?", const="", default=None, metavar="KOTA;KOTA",
+                        help="Buka dasbor multi-kota (daftar dipisah ';', default: env WEATHER_DASHBOARD_CITIES "
+                             "atau 100 kota terpopuler dari indeks)")
+    parser.add_argument("--host", default=API_HOST, help="Host server API (default: env WEATHER_API_HOST)")
+    parser.add_argument("--port", type=int, default=API_PORT, help="Port server API (default: env WEATHER_API_PORT)")
+    parser.add_argument("--source", choices=["inprocess", "remote"], default=GUI_DATA_SOURCE,
+                        help="Sumber data GUI (default: env WEATHER_GUI_SOURCE atau inprocess)")
+    parser.add_argument("--api-url", default=WEATHER_API_URL,
+                        help="URL server API untuk --source remote (default: env WEATHER_API_URL)")
+    args = parser.parse_args()
+    if args.workers is not None and args.workers < 1:
+        parser.error("--workers harus minimal 1")
+
+    if args.async_api:
+        # Mode headless: hanya API asyncio, tanpa GUI
+        run_api_async(args.host, args.port)
+        sys.exit(0)
+
+    if args.workers is not None:
+        # Mode production: master + worker pre-fork, tanpa GUI
+        run_api_workers(args.host, args.port, args.workers)
+        sys.exit(0)
+
+    if args.api_only:
+        # Mode headless: hanya API Flask, tanpa GUI
+        run_api(args.host, args.port)
+        sys.exit(0)
 
-    time.sleep(1)
+    # Pada mode remote GUI memakai server API terpisah, jadi server lokal tidak perlu dijalankan
+    if args.source == "inprocess":
+        start_api_server(args.host, args.port)
 
+    load_gui_modules()
     root = tk.Tk()
-    app = WeatherApp(root)
-    root.mainloop()
\ No newline at end of file
+    source = create_weather_source(args.source, args.api_url)
+    if args.dashboard is not None:
+        cities = [city.strip() for city in args.dashboard.split(";") if city.strip()] or DASHBOARD_CITIES
+        if not cities:
+            cities = [f"{name}, {country}" for name, country in city_index.top(100)]
+        dashboard = WeatherDashboard(root, cities, source=source)
+    else:
+        weather_app = WeatherApp(root, source=source)
+    root.mainloop()
@@ -0,0 +1,287 @@
+"""Server tiruan OpenWeatherMap untuk benchmark dan pengujian offline.
+
+Meniru endpoint yang dipakai api6_.py:
+    /data/2.5/weather?q=<kota>       (juga ?lat=&lon=)
+    /data/2.5/group?id=<id,id,...>
+    /img/wn/<kode>@2x.png
+serta endpoint kontrol:
+    /_stats   jumlah panggilan per endpoint (JSON)
+    /_reset   reset counter
+
+Contoh:
+    python benchmarks/fake_owm.py --port 8081 --latency-ms 80 --error-rate 0.01
+    export OWM_API_URL=http://127.0.0.1:8081/data/2.5/
+    export OWM_ICON_URL=http://127.0.0.1:8081/img/wn/
+
+Hanya memakai standard library supaya bisa jalan di mesin Linux polos.
+"""
+
+import argparse
+import json
+import random
+import struct
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# (nama, kode negara, lat, lon, offset timezone dalam detik)
+KNOWN_CITIES = [
+    ("Jakarta", "ID", -6.2146, 106.8451, 25200),
+    ("Bandung", "ID", -6.9222, 107.6069, 25200),
+    ("Surabaya", "ID", -7.2492, 112.7508, 25200),
+    ("Medan", "ID", 3.5833, 98.6667, 25200),
+    ("Semarang", "ID", -6.9932, 110.4203, 25200),
+    ("Yogyakarta", "ID", -7.8014, 110.3647, 25200),
+    ("Makassar", "ID", -5.1464, 119.4386, 28800),
+    ("Denpasar", "ID", -8.65, 115.2167, 28800),
+    ("Palembang", "ID", -2.9167, 104.7458, 25200),
+    ("Balikpapan", "ID", -1.2675, 116.8289, 28800),
+    ("Manado", "ID", 1.487, 124.8455, 28800),
+    ("Jayapura", "ID", -2.5333, 140.7, 32400),
+    ("Kuala Lumpur", "MY", 3.1412, 101.6865, 28800),
+    ("Singapore", "SG", 1.2897, 103.8501, 28800),
+    ("Bangkok", "TH", 13.75, 100.5167, 25200),
+    ("Manila", "PH", 14.6042, 120.9822, 28800),
+    ("Tokyo", "JP", 35.6895, 139.6917, 32400),
+    ("Seoul", "KR", 37.5683, 126.9778, 32400),
+    ("Sydney", "AU", -33.8679, 151.2073, 36000),
+    ("London", "GB", 51.5085, -0.1257, 0),
+    ("Paris", "FR", 48.8534, 2.3488, 3600),
+    ("Berlin", "DE", 52.5244, 13.4105, 3600),
+    ("New York", "US", 40.7143, -74.006, -18000),
+    ("Los Angeles", "US", 34.0522, -118.2437, -28800),
+]
+
+DESCRIPTIONS = [
+    ("cerah", "01"), ("sedikit berawan", "02"), ("awan tersebar", "03"), ("awan mendung", "04"),
+    ("hujan rintik-rintik", "09"), ("hujan ringan", "10"), ("badai petir", "11"), ("salju", "13"), ("kabut", "50"),
+]
+
+
+def _png_icon(size=100, rgba=(255, 202, 40, 255)):
+    """PNG polos berukuran size x size (tanpa PIL)."""
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xffffffff)
+
+    row = b"\x00" + bytes(rgba) * size
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", size, size, 8, 6, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(row * size))
+            + chunk(b"IEND", b""))
+
+
+class FakeOWM:
+    """State server tiruan: daftar kota, latensi, tingkat error, dan counter panggilan."""
+
+    def __init__(self, latency_ms=50.0, jitter_ms=20.0, error_rate=0.0, accept_all=False, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.accept_all = accept_all
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = {}
+        self.icon = _png_icon()
+        self.cities = {}
+        self.cities_by_id = {}
+        for index, (name, country, lat, lon, tz) in enumerate(KNOWN_CITIES):
+            self._add_city(1000 + index, name, country, lat, lon, tz)
+
+    def _add_city(self, city_id, name, country, lat, lon, tz):
+        city = {"id": city_id, "name": name, "country": country, "lat": lat, "lon": lon, "timezone": tz}
+        self.cities[name.casefold()] = city
+        self.cities_by_id[city_id] = city
+        return city
+
+    def count(self, endpoint):
+        with self._lock:
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self.calls, total=sum(self.calls.values()))
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
+
+    def delay(self):
+        with self._lock:
+            delay_ms = max(0.0, self._random.gauss(self.latency_ms, self.jitter_ms)) if self.jitter_ms else self.latency_ms
+            failed = self._random.random() < self.error_rate
+        time.sleep(delay_ms / 1000.0)
+        return failed
+
+    def add_synthetic_city(self, name):
+        """Daftarkan kota sintetis (koordinat dari hash nama) supaya dijawab 200."""
+        key = " ".join(name.split()).casefold()
+        with self._lock:
+            return self.cities.get(key) or self._add_city(
+                100000 + len(self.cities), " ".join(name.split()).title(), "XX",
+                (zlib.crc32(key.encode()) % 18000) / 100.0 - 90,
+                (zlib.crc32(key[::-1].encode()) % 36000) / 100.0 - 180, 0)
+
+    def find_city(self, name):
+        # Seperti OWM, "Jakarta,ID" juga diterima (kode negara di belakang koma)
+        name, _, country = name.partition(",")
+        key = " ".join(name.split()).casefold()
+        city = self.cities.get(key)
+        if city is not None and country.strip() and city["country"] != country.strip().upper():
+            return None
+        if city is None and self.accept_all and key:
+            city = self.add_synthetic_city(name)
+        return city
+
+    def nearest_city(self, lat, lon):
+        return min(self.cities_by_id.values(), key=lambda c: (c["lat"] - lat) ** 2 + (c["lon"] - lon) ** 2)
+
+    def payload(self, city, group=False):
+        """Payload realistis /data/2.5/weather; berubah tiap 10 menit seperti data OWM."""
+        bucket = int(time.time() // 600)
+        rnd = random.Random(f"{city['id']}:{bucket}")
+        description, icon_num = rnd.choice(DESCRIPTIONS)
+        now = int(time.time())
+        day_start = now - now % 86400 - city["timezone"]
+        temp = round(rnd.uniform(18, 34), 2)
+        sys_block = {"type": 1, "id": rnd.randint(9000, 9999), "country": city["country"],
+                     "sunrise": day_start + 5 * 3600 + 45 * 60, "sunset": day_start + 17 * 3600 + 50 * 60}
+        data = {
+            "coord": {"lon": city["lon"], "lat": city["lat"]},
+            "weather": [{"id": 800, "main": description.title(), "description": description,
+                         "icon": f"{icon_num}{'d' if rnd.random() < 0.6 else 'n'}"}],
+            "base": "stations",
+            "main": {"temp": temp, "feels_like": round(temp + rnd.uniform(-2, 4), 2),
+                     "temp_min": temp - 1, "temp_max": temp + 1,
+                     "pressure": rnd.randint(1000, 1020), "humidity": rnd.randint(40, 95)},
+            "visibility": rnd.choice([6000, 8000, 10000]),
+            "wind": {"speed": round(rnd.uniform(0, 8), 2), "deg": rnd.randint(0, 359)},
+            "clouds": {"all": rnd.randint(0, 100)},
+            "dt": now,
+            "sys": sys_block,
+            "id": city["id"],
+            "name": city["name"],
+            "cod": 200,
+        }
+        if group:
+            sys_block["timezone"] = city["timezone"]
+        else:
+            data["timezone"] = city["timezone"]
+        return data
+
+
+class FakeOWMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "FakeOWM/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type="application/json; charset=utf-8"):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        owm = self.server.owm
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+
+        if url.path == "/_stats":
+            return self._send(200, owm.stats())
+        if url.path == "/_reset":
+            owm.reset()
+            return self._send(200, {"reset": True})
+
+        if url.path.startswith("/img/wn/"):
+            owm.count("icon")
+            owm.delay()
+            return self._send(200, owm.icon, "image/png")
+
+        if url.path.endswith("/weather"):
+            owm.count("weather")
+            if owm.delay():
+                return self._send(500, {"cod": 500, "message": "Internal error"})
+            if "lat" in query and "lon" in query:
+                try:
+                    city = owm.nearest_city(float(query["lat"]), float(query["lon"]))
+                except ValueError:
+                    return self._send(400, {"cod": "400", "message": "wrong latitude"})
+            else:
+                city = owm.find_city(query.get("q", ""))
+            if city is None:
+                return self._send(404, {"cod": "404", "message": "city not found"})
+            return self._send(200, owm.payload(city))
+
+        if url.path.endswith("/group"):
+            owm.count("group")
+            if owm.delay():
+                return self._send(500, {"cod": 500, "message": "Internal error"})
+            ids = [int(part) for part in query.get("id", "").split(",") if part.strip().isdigit()]
+            cities = [owm.cities_by_id[i] for i in ids if i in owm.cities_by_id]
+            return self._send(200, {"cnt": len(cities), "list": [owm.payload(c, group=True) for c in cities]})
+
+        owm.count("other")
+        self._send(404, {"cod": "404", "message": "Internal error: not found"})
+
+
+class FakeOWMServer:
+    """Jalankan FakeOWM di thread background; dipakai oleh benchmarks/load.py."""
+
+    def __init__(self, host="127.0.0.1", port=0, **owm_options):
+        self.owm = FakeOWM(**owm_options)
+        self.httpd = ThreadingHTTPServer((host, port), FakeOWMHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.owm = self.owm
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def api_url(self):
+        return f"{self.base_url}/data/2.5/"
+
+    @property
+    def icon_url(self):
+        return f"{self.base_url}/img/wn/"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fake-owm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Latensi rata-rata per request")
+    parser.add_argument("--jitter-ms", type=float, default=20.0, help="Standar deviasi latensi")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Peluang respons 500 (0..1)")
+    parser.add_argument("--accept-all", action="store_true",
+                        help="Kota yang tidak dikenal dijawab dengan data sintetis, bukan 404")
+    args = parser.parse_args()
+
+    server = FakeOWMServer(args.host, args.port, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                           error_rate=args.error_rate, accept_all=args.accept_all)
+    print(f"Fake OWM berjalan di {server.base_url} (OWM_API_URL={server.api_url})")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""Load test dan benchmark latensi untuk api6_.py memakai server OWM tiruan.
+
+Dua target:
+    api  - request HTTP ke /weather pada proses `api6_.py --api-only`
+    gui  - jalur fetch GUI (WeatherSource.get_weather) di proses ini
+
+Contoh:
+    python benchmarks/load.py --target api --concurrency 32 --requests 5000 --output api.json
+    python benchmarks/load.py --target gui --source inprocess --cities 200 --latency-ms 120
+
+Hasil: throughput, latensi p50/p95/p99, jumlah error, dan jumlah panggilan ke
+OWM tiruan. Dengan --output hasil disimpan sebagai JSON supaya bisa dibandingkan
+antar run. Semua berjalan offline.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+API_SCRIPT = os.path.join(REPO_DIR, "api6_.py")
+sys.path.insert(0, BENCH_DIR)
+
+from fake_owm import KNOWN_CITIES, FakeOWMServer  # noqa: E402
+
+
+def percentile(sorted_values, pct):
+    """Persentil nearest-rank dari list yang sudah diurutkan."""
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(pct / 100.0 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def build_city_list(owm, count, unknown_rate, seed):
+    """Daftar kota dengan distribusi miring (Zipf) seperti trafik nyata, plus kota tak dikenal (404)."""
+    names = [name for name, *_ in KNOWN_CITIES]
+    for i in range(max(0, count - len(names))):
+        names.append(owm.add_synthetic_city(f"Kota {i}")["name"])
+    names = names[:count]
+    weights = [1.0 / (rank + 1) for rank in range(len(names))]
+    rnd = random.Random(seed)
+
+    def pick():
+        if unknown_rate and rnd.random() < unknown_rate:
+            return f"Xyzzy{rnd.randint(0, 10 ** 6)}"
+        return rnd.choices(names, weights)[0]
+
+    return pick
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_api_process(env, extra_args=()):
+    """Jalankan `api6_.py --api-only` dan tunggu sampai siap; mengembalikan (proses, base_url)."""
+    port = _free_port()
+    proc = subprocess.Popen([sys.executable, API_SCRIPT, "--api-only", "--port", str(port), *extra_args],
+                            env=env, cwd=REPO_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"{base_url}/stats", timeout=1) as res:
+                res.read()
+            return proc, base_url
+        except OSError:
+            if proc.poll() is not None:
+                raise RuntimeError(f"api6_.py exited with code {proc.returncode}")
+            time.sleep(0.01)
+    proc.terminate()
+    raise RuntimeError("api6_.py did not become ready")
+
+
+def run_load(call, pick_city, concurrency, total_requests, duration):
+    """Jalankan `call(city)` dari `concurrency` worker; mengembalikan (latensi, status, waktu total)."""
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    remaining = [total_requests]
+    deadline = time.perf_counter() + duration if duration else None
+
+    def worker():
+        local_latencies = []
+        local_statuses = {}
+        while True:
+            with lock:
+                if remaining[0] <= 0 or (deadline and time.perf_counter() >= deadline):
+                    break
+                remaining[0] -= 1
+                city = pick_city()
+            start = time.perf_counter()
+            try:
+                status = call(city)
+            except Exception as e:
+                status = type(e).__name__
+            local_latencies.append(time.perf_counter() - start)
+            local_statuses[status] = local_statuses.get(status, 0) + 1
+        with lock:
+            latencies.extend(local_latencies)
+            for status, count in local_statuses.items():
+                statuses[status] = statuses.get(status, 0) + count
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    return latencies, statuses, time.perf_counter() - started
+
+
+def make_api_call(base_url):
+    import requests
+
+    local = threading.local()
+
+    def call(city):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        res = session.get(f"{base_url}/weather", params={"city": city}, timeout=30)
+        _ = res.content  # baca body sampai habis: latensi mencakup transfer respons
+        return res.status_code
+
+    return call
+
+
+def make_gui_call(source_mode, api_url):
+    import api6_
+
+    source = api6_.create_weather_source(source_mode, api_url)
+
+    def call(city):
+        try:
+            source.get_weather(city)
+            return "ok"
+        except api6_.WeatherSourceError:
+            return "error"
+
+    return call
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=["api", "gui"], default="api")
+    parser.add_argument("--source", choices=["inprocess", "remote"], default="inprocess",
+                        help="Sumber data untuk --target gui")
+    parser.add_argument("--api-url", help="Pakai server API yang sudah berjalan (target api / gui remote); "
+                             "upstream_calls hanya terhitung jika server itu memakai OWM tiruan")
+    parser.add_argument("--api-args", default="", help="Argumen tambahan untuk proses api6_.py, dipisah spasi")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=2000, help="Jumlah total request")
+    parser.add_argument("--duration", type=float, default=0, help="Batas waktu (detik); 0 = tanpa batas")
+    parser.add_argument("--cities", type=int, default=200, help="Jumlah kota berbeda")
+    parser.add_argument("--unknown-rate", type=float, default=0.0, help="Porsi request untuk kota tak dikenal")
+    parser.add_argument("--latency-ms", type=float, default=80.0, help="Latensi OWM tiruan")
+    parser.add_argument("--jitter-ms", type=float, default=20.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Porsi respons 500 dari OWM tiruan")
+    parser.add_argument("--no-rate-limit", action="store_true",
+                        help="Matikan limiter upstream (OWM_RATE_LIMIT=0); default memakai konfigurasi bawaan")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Simpan hasil sebagai JSON ke file ini")
+    args = parser.parse_args()
+
+    fake = FakeOWMServer(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+                         seed=args.seed).start()
+    env = dict(os.environ, OWM_API_URL=fake.api_url, OWM_ICON_URL=fake.icon_url)
+    env.setdefault("OPENWEATHERMAP_API_KEY", "benchmark")
+    # Mulai dari cache dingin: jangan warm restart dari observasi run sebelumnya
+    env.setdefault("WEATHER_STORE_PATH", "")
+    if args.no_rate_limit:
+        # OWM tiruan tidak punya kuota; tanpa flag ini limiter bawaan ikut diukur
+        env["OWM_RATE_LIMIT"] = os.environ["OWM_RATE_LIMIT"] = "0"
+    os.environ.update(
+        WEATHER_STORE_PATH=env["WEATHER_STORE_PATH"],
+        OWM_API_URL=fake.api_url,
+        OWM_ICON_URL=fake.icon_url,
+        OPENWEATHERMAP_API_KEY=env["OPENWEATHERMAP_API_KEY"],
+    )
+    sys.path.insert(0, REPO_DIR)
+
+    proc = None
+    try:
+        api_url = args.api_url
+        needs_server = args.target == "api" or args.source == "remote"
+        if needs_server and not api_url:
+            proc, api_url = start_api_process(env, args.api_args.split())
+
+        call = make_api_call(api_url) if args.target == "api" else make_gui_call(args.source, api_url)
+        pick_city = build_city_list(fake.owm, args.cities, args.unknown_rate, args.seed)
+        fake.owm.reset()
+        latencies, statuses, elapsed = run_load(call, pick_city, args.concurrency, args.requests, args.duration)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+        fake.stop()
+
+    latencies.sort()
+    completed = len(latencies)
+    result = {
+        "target": args.target if args.target == "api" else f"gui-{args.source}",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "requests": completed,
+        "elapsed_s": round(elapsed, 4),
+        "throughput_rps": round(completed / elapsed, 2) if elapsed else None,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 3) if latencies else None,
+            "p95": round(percentile(latencies, 95) * 1000, 3) if latencies else None,
+            "p99": round(percentile(latencies, 99) * 1000, 3) if latencies else None,
+            "max": round(latencies[-1] * 1000, 3) if latencies else None,
+        },
+        "statuses": {str(status): count for status, count in statuses.items()},
+        "upstream_calls": fake.owm.stats(),
+    }
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
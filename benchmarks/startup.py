@@ -0,0 +1,100 @@
+"""Benchmark waktu startup api6_.py: waktu import dan time-to-first-request.
+
+Contoh:
+    python benchmarks/startup.py --runs 5 --output startup.json
+
+Setiap run memakai proses Python baru supaya cache import tidak ikut terhitung.
+Server dijalankan dalam mode --api-only; OWM tidak dipanggil (yang diukur hanya
+sampai server menjawab request pertama ke /stats).
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API_SCRIPT = os.path.join(REPO_DIR, "api6_.py")
+
+IMPORT_SNIPPET = (
+    "import sys, time\n"
+    "t = time.perf_counter()\n"
+    "import api6_\n"
+    "elapsed = time.perf_counter() - t\n"
+    "print(elapsed, 'tkinter' in sys.modules, 'PIL' in sys.modules)\n"
+)
+
+
+def _env():
+    env = dict(os.environ)
+    env.setdefault("OPENWEATHERMAP_API_KEY", "benchmark")
+    env.setdefault("WEATHER_STORE_PATH", "")
+    env["PYTHONPATH"] = REPO_DIR + os.pathsep + env.get("PYTHONPATH", "")
+    return env
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_import():
+    """Waktu `import api6_` di proses baru; juga mengecek apakah stack GUI ikut ter-import."""
+    out = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], env=_env(), cwd=REPO_DIR,
+                         capture_output=True, text=True, check=True).stdout.split()
+    return {"import_s": float(out[0]), "tkinter_loaded": out[1] == "True", "pil_loaded": out[2] == "True"}
+
+
+def measure_first_request(timeout=30.0):
+    """Waktu dari spawn `api6_.py --api-only` sampai request pertama dijawab."""
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}/stats"
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, API_SCRIPT, "--api-only", "--port", str(port)],
+                            env=_env(), cwd=REPO_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(url, timeout=1) as res:
+                    res.read()
+                return time.perf_counter() - start
+            except OSError:
+                if proc.poll() is not None:
+                    raise RuntimeError(f"api6_.py exited with code {proc.returncode}")
+                time.sleep(0.005)
+        raise RuntimeError(f"Server not ready after {timeout}s")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", help="Simpan hasil sebagai JSON ke file ini")
+    args = parser.parse_args()
+
+    imports = [measure_import() for _ in range(args.runs)]
+    first_requests = [measure_first_request() for _ in range(args.runs)]
+
+    result = {
+        "runs": args.runs,
+        "import_median_s": statistics.median(r["import_s"] for r in imports),
+        "first_request_median_s": statistics.median(first_requests),
+        "tkinter_loaded_on_import": any(r["tkinter_loaded"] for r in imports),
+        "pil_loaded_on_import": any(r["pil_loaded"] for r in imports),
+    }
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
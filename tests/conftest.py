@@ -0,0 +1,26 @@
+import os
+import sys
+import time
+
+import pytest
+
+# Konfigurasi dibaca saat import api6_: set sebelum modul di-import oleh test
+os.environ.setdefault("OPENWEATHERMAP_API_KEY", "test-key")
+os.environ.setdefault("OWM_API_URL", "http://127.0.0.1:9/")  # tidak pernah ke OWM sungguhan
+os.environ.setdefault("WEATHER_STORE_PATH", "")
+os.environ.setdefault("WEATHER_ICON_PREFETCH", "0")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def wait_until():
+    """Tunggu sampai ``predicate()`` bernilai benar (gagal setelah ``timeout`` detik)."""
+
+    def wait(predicate, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while not predicate():
+            assert time.monotonic() < deadline, "timeout menunggu kondisi"
+            time.sleep(0.005)
+
+    return wait
@@ -0,0 +1,57 @@
+from types import SimpleNamespace
+
+import api6_
+
+
+class FakeSource:
+    def __init__(self, on_fetch=None):
+        self.cities = []
+        self.on_fetch = on_fetch
+
+    def get_weather(self, city):
+        self.cities.append(city)
+        if self.on_fetch is not None:
+            self.on_fetch()
+        return {"city": city}
+
+
+def _headless_app(source):
+    """WeatherApp tanpa Tk: hanya state yang dipakai jalur fetch, root.after langsung dijalankan."""
+    app = api6_.WeatherApp.__new__(api6_.WeatherApp)
+    app.source = source
+    app._generation = 0
+    app.stale_results_dropped = 0
+    app.root = SimpleNamespace(after=lambda delay, fn, *args: fn(*args))
+    app.displayed = []
+    app.update_weather_display = app.displayed.append
+    app.set_loading_state = lambda loading: None
+    return app
+
+
+def test_latest_search_is_displayed():
+    source = FakeSource()
+    app = _headless_app(source)
+    app._generation = 1
+    app.get_and_display_weather("Jakarta", generation=1)
+    assert app.displayed == [{"city": "Jakarta"}]
+    assert app.stale_results_dropped == 0
+
+
+def test_superseded_search_does_not_call_the_source():
+    source = FakeSource()
+    app = _headless_app(source)
+    app._generation = 2  # pencarian lain sudah dimulai sebelum worker sempat berjalan
+    app.get_and_display_weather("Jakarta", generation=1)
+    assert source.cities == []
+    assert app.displayed == []
+    assert app.stale_results_dropped == 1
+
+
+def test_result_of_an_older_search_is_dropped_before_rendering():
+    app = _headless_app(None)
+    app.source = FakeSource(on_fetch=lambda: setattr(app, "_generation", app._generation + 1))
+    app._generation = 1
+    app.get_and_display_weather("Jakarta", generation=1)
+    assert app.source.cities == ["Jakarta"]
+    assert app.displayed == []
+    assert app.stale_results_dropped == 1
@@ -0,0 +1,116 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import api6_
+from api6_ import CircuitBreaker, UpstreamHedger, UpstreamRateLimiter
+
+
+class FakeClient:
+    """Client upstream palsu: percobaan ke-n menunggu ``delays[n]`` detik lalu menjawab dengan status-nya."""
+
+    def __init__(self, *attempts):
+        self.attempts = list(attempts)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def get(self, url, params=None):
+        with self._lock:
+            delay, status = self.attempts[self.calls]
+            attempt = self.calls
+            self.calls += 1
+        time.sleep(delay)
+        return SimpleNamespace(status_code=status, attempt=attempt)
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    limiter = UpstreamRateLimiter(rate=100, burst=10)
+    monkeypatch.setattr(api6_, "upstream_limiter", limiter)
+    return limiter
+
+
+def _hedger(client):
+    return UpstreamHedger(client, enabled=True, initial_delay=0.05, min_delay=0.01, max_workers=4)
+
+
+def test_fast_first_attempt_is_not_hedged(limiter):
+    client = FakeClient((0.0, 200))
+    hedger = _hedger(client)
+    assert hedger.get("http://owm/weather").attempt == 0
+    assert client.calls == 1
+    assert hedger.stats()["hedged"] == 0
+
+
+def test_slow_first_attempt_is_hedged_and_faster_copy_wins(limiter):
+    client = FakeClient((1.0, 200), (0.0, 200))
+    hedger = _hedger(client)
+    start = time.monotonic()
+    assert hedger.get("http://owm/weather").attempt == 1
+    assert time.monotonic() - start < 0.5
+    stats = hedger.stats()
+    assert (stats["hedged"], stats["hedge_wins"]) == (1, 1)
+    assert limiter.stats()["admitted"] == 1  # hedge ikut mengambil token
+
+
+def test_hedge_waits_for_the_other_attempt_after_a_5xx(limiter):
+    client = FakeClient((0.2, 200), (0.0, 503))
+    hedger = _hedger(client)
+    assert hedger.get("http://owm/weather").attempt == 0
+    assert hedger.stats()["hedge_wins"] == 0
+
+
+def test_no_hedge_without_a_free_token(monkeypatch):
+    limiter = UpstreamRateLimiter(rate=0.001, burst=1)
+    monkeypatch.setattr(api6_, "upstream_limiter", limiter)
+    assert limiter.try_acquire()
+    client = FakeClient((0.2, 200), (0.0, 200))
+    hedger = _hedger(client)
+    assert hedger.get("http://owm/weather").attempt == 0
+    assert client.calls == 1
+    assert hedger.stats()["skipped"] == 1
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()  # sukses mereset hitungan
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.allow() and breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert breaker.stats()["rejected"] == 1
+    assert 1 <= breaker.retry_after() <= 60
+
+
+def test_breaker_half_open_probe_closes_or_reopens():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    assert not breaker.allow()
+    time.sleep(0.06)
+
+    # Setelah reset_timeout hanya satu probe yang diizinkan
+    assert breaker.allow() and breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow() and breaker.allow()
+    stats = breaker.stats()
+    assert (stats["opened"], stats["half_opened"], stats["closed"]) == (2, 2, 1)
+
+
+def test_disabled_breaker_always_allows():
+    breaker = CircuitBreaker(failure_threshold=0)
+    for _ in range(10):
+        breaker.record_failure()
+    assert breaker.allow() and breaker.state == CircuitBreaker.CLOSED
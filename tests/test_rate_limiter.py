@@ -0,0 +1,93 @@
+import threading
+
+import pytest
+
+import api6_
+from api6_ import PRIORITY_BACKGROUND, PRIORITY_BATCH, PRIORITY_INTERACTIVE, UpstreamBusy, UpstreamRateLimiter
+
+
+def _start_waiter(limiter, priority, outcomes):
+    def run():
+        try:
+            limiter.acquire(priority)
+            outcomes.append(priority)
+        except UpstreamBusy:
+            outcomes.append(("busy", priority))
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_burst_then_empty():
+    limiter = UpstreamRateLimiter(rate=0.001, burst=3)
+    assert [limiter.try_acquire() for _ in range(4)] == [True, True, True, False]
+    assert limiter.stats()["admitted"] == 3
+
+
+def test_disabled_limiter_always_admits_and_counts_calls():
+    limiter = UpstreamRateLimiter(rate=0, burst=1)
+    for _ in range(5):
+        limiter.acquire()
+    assert limiter.calls == 5
+
+
+def test_higher_priority_waiter_is_served_first(wait_until):
+    limiter = UpstreamRateLimiter(rate=4, burst=1, max_queue=10, max_wait=5, max_wait_batch=5)
+    limiter.pause(0.3)  # token habis: kedua waiter harus antre
+    outcomes = []
+    threads = [_start_waiter(limiter, PRIORITY_BACKGROUND, outcomes)]
+    wait_until(lambda: limiter.stats()["waiting"] == 1)
+    threads.append(_start_waiter(limiter, PRIORITY_INTERACTIVE, outcomes))
+    for thread in threads:
+        thread.join(5)
+
+    assert outcomes == [PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND]
+    assert limiter.stats()["queued"] == 2
+
+
+def test_full_queue_evicts_lowest_priority_waiter(wait_until):
+    limiter = UpstreamRateLimiter(rate=4, burst=1, max_queue=1, max_wait=5, max_wait_batch=5)
+    limiter.pause(0.3)
+    outcomes = []
+    background = _start_waiter(limiter, PRIORITY_BACKGROUND, outcomes)
+    wait_until(lambda: limiter.stats()["waiting"] == 1)
+    interactive = _start_waiter(limiter, PRIORITY_INTERACTIVE, outcomes)
+    background.join(5)
+    interactive.join(5)
+
+    assert outcomes == [("busy", PRIORITY_BACKGROUND), PRIORITY_INTERACTIVE]
+    assert limiter.stats()["evicted"] == 1
+
+
+def test_full_queue_rejects_when_nothing_lower_to_evict(wait_until):
+    limiter = UpstreamRateLimiter(rate=4, burst=1, max_queue=1, max_wait=5, max_wait_batch=5)
+    limiter.pause(0.3)
+    outcomes = []
+    waiter = _start_waiter(limiter, PRIORITY_INTERACTIVE, outcomes)
+    wait_until(lambda: limiter.stats()["waiting"] == 1)
+    with pytest.raises(UpstreamBusy) as busy:
+        limiter.acquire(PRIORITY_BATCH)
+    assert busy.value.retry_after >= 1
+    waiter.join(5)
+    assert outcomes == [PRIORITY_INTERACTIVE]
+    assert limiter.stats()["rejected"] == 1
+
+
+def test_wait_longer_than_max_wait_fails_fast():
+    limiter = UpstreamRateLimiter(rate=1, burst=1, max_wait=0.5, max_wait_batch=10)
+    limiter.pause(3)  # misalnya Retry-After dari respons 429
+    with pytest.raises(UpstreamBusy) as busy:
+        limiter.acquire(PRIORITY_INTERACTIVE)
+    assert busy.value.retry_after == 3
+    assert not limiter.try_acquire()
+    assert limiter.stats()["pauses"] == 1
+
+
+def test_owm_429_pauses_the_limiter(monkeypatch):
+    limiter = UpstreamRateLimiter(rate=100, burst=5)
+    monkeypatch.setattr(api6_, "upstream_limiter", limiter)
+    result = api6_._upstream_status_error(429, "Too Many Requests", 30)
+    assert result["retry_after"] == 30
+    assert not limiter.try_acquire()
+    assert limiter.stats()["paused_for"] > 29
@@ -0,0 +1,95 @@
+import multiprocessing
+import os
+
+import pytest
+
+import api6_
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork"), reason="cache bersama dipakai worker pre-fork (os.fork)")
+
+
+@pytest.fixture
+def shared(tmp_path):
+    cache = api6_.SharedWeatherCache(path=str(tmp_path / "shared.cache"), slots=16, slot_bytes=512, max_age=3600)
+    cache.open()
+    yield cache
+    cache.close()
+
+
+def _in_child(target, *args):
+    """Jalankan ``target(*args)`` di proses hasil fork (mewarisi map seperti worker) dan kembalikan hasilnya."""
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    process = context.Process(target=lambda: results.put(target(*args)))
+    process.start()
+    result = results.get(timeout=10)
+    process.join(10)
+    assert process.exitcode == 0
+    return result
+
+
+def test_value_written_by_one_process_is_read_by_another(shared):
+    assert _in_child(shared.set, "jakarta,id", {"city": "Jakarta", "temp": 30})
+    value, age = shared.get("jakarta,id")
+    assert value == {"city": "Jakarta", "temp": 30}
+    assert 0 <= age < 5
+
+    shared.set("bandung,id", {"city": "Bandung", "temp": 24})
+    assert _in_child(lambda: shared.get("bandung,id")[0]) == {"city": "Bandung", "temp": 24}
+    assert shared.get("surabaya,id") == (None, None)
+
+
+def test_same_path_reopened_sees_existing_values(shared):
+    shared.set("jakarta,id", {"temp": 30})
+    other = api6_.SharedWeatherCache(path=shared.path, slots=16, slot_bytes=512, max_age=3600)
+    other.open()
+    try:
+        assert other.get("jakarta,id")[0] == {"temp": 30}
+    finally:
+        other.close()
+
+
+def test_fetch_lease_is_exclusive_across_processes(shared):
+    assert shared.try_lease("jakarta,id", 30)
+    assert _in_child(shared.try_lease, "jakarta,id", 30) is False
+    shared.set("jakarta,id", {"temp": 30})  # observasi baru melepas lease
+    assert _in_child(shared.try_lease, "jakarta,id", 30) is True
+
+
+def test_oversize_value_is_skipped_and_releases_the_lease(shared):
+    assert shared.try_lease("jakarta,id", 30)
+    assert shared.set("jakarta,id", {"blob": "x" * 1024}) is False
+    assert shared.stats()["oversize"] == 1
+    assert _in_child(shared.try_lease, "jakarta,id", 30) is True
+
+
+def test_token_bucket_is_shared_between_processes(shared):
+    limiter = api6_.UpstreamRateLimiter(rate=0.001, burst=3)
+    limiter.share(shared)
+    assert _in_child(lambda: [limiter.try_acquire() for _ in range(2)]) == [True, True]
+    assert limiter.try_acquire()
+    assert not limiter.try_acquire()
+
+
+def test_reader_never_sees_a_torn_write(shared):
+    # Panjang sama: tulisan yang terbaca setengah jadi tetap JSON valid, jadi pasti tertangkap assert
+    values = [{"temp": 1, "pad": "a" * 200}, {"temp": 2, "pad": "b" * 200}]
+
+    def writer():
+        for i in range(2000):
+            shared.set("jakarta,id", values[i % 2])
+        return True
+
+    shared.set("jakarta,id", values[0])
+    context = multiprocessing.get_context("fork")
+    process = context.Process(target=writer)
+    process.start()
+    seen = set()
+    while process.is_alive():
+        value, _ = shared.get("jakarta,id")
+        if value is not None:  # pembaca boleh menyerah saat slot terus berubah, tetapi tidak boleh salah baca
+            assert value in values
+            seen.add(value["temp"])
+    process.join(10)
+    assert process.exitcode == 0
+    assert seen
@@ -0,0 +1,75 @@
+import threading
+
+import pytest
+
+import api6_
+
+
+def test_concurrent_callers_share_one_call(wait_until):
+    flight = api6_.SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def fetch(city):
+        calls.append(city)
+        release.wait(5)
+        return {"city": city}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("jakarta,id", fetch, "Jakarta")))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    wait_until(lambda: flight.stats()["joins"] == 7)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert calls == ["Jakarta"]
+    assert sorted(leader for _, leader in results) == [False] * 7 + [True]
+    assert all(result is results[0][0] for result, _ in results)
+    assert flight.stats() == {"leads": 1, "joins": 7, "in_flight": 0}
+
+
+def test_followers_receive_the_leader_error(wait_until):
+    flight = api6_.SingleFlight()
+    release = threading.Event()
+
+    def fetch():
+        release.wait(5)
+        raise ValueError("upstream rusak")
+
+    errors = []
+
+    def call():
+        try:
+            flight.do("a", fetch)
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    wait_until(lambda: flight.stats()["joins"] == 2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(errors) == 3 and all(e is errors[0] for e in errors)
+
+
+def test_finished_key_runs_again_and_keys_are_independent():
+    flight = api6_.SingleFlight()
+    calls = []
+
+    def fetch(key):
+        calls.append(key)
+        return key
+
+    assert flight.do("a", fetch, "a") == ("a", True)
+    assert flight.do("a", fetch, "a") == ("a", True)
+    assert flight.do("b", fetch, "b") == ("b", True)
+    assert calls == ["a", "a", "b"]
+    with pytest.raises(KeyError):
+        flight.do("c", {}.__getitem__, "c")
+    assert flight.stats()["in_flight"] == 0
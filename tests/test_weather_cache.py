@@ -0,0 +1,64 @@
+import threading
+
+import api6_
+
+
+def test_fresh_then_stale_then_expired():
+    cache = api6_.WeatherCache(ttl=60, max_entries=10, max_stale=600)
+    cache.set("jakarta,id", {"temp": 30})
+    assert cache.get("jakarta,id") == ({"temp": 30}, False)
+
+    cache.set("jakarta,id", {"temp": 31}, age=120)
+    assert cache.get("jakarta,id") == ({"temp": 31}, True)
+
+    cache.set("jakarta,id", {"temp": 32}, age=700)
+    assert cache.get("jakarta,id") == (None, False)
+    stats = cache.stats()
+    assert (stats["hits"], stats["stale_hits"], stats["misses"]) == (1, 1, 1)
+    assert stats["size"] == 0
+
+
+def test_lru_evicts_least_recently_used():
+    cache = api6_.WeatherCache(ttl=60, max_entries=2, max_stale=0)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")  # "b" sekarang yang paling lama tidak dipakai
+    cache.set("c", 3)
+    assert cache.get("b") == (None, False)
+    assert cache.get("a") == (1, False)
+    assert cache.get("c") == (3, False)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_begin_refresh_is_exclusive():
+    cache = api6_.WeatherCache()
+    assert cache.begin_refresh("a")
+    assert not cache.begin_refresh("a")
+    cache.end_refresh("a")
+    assert cache.begin_refresh("a")
+
+
+def test_get_weather_serves_stale_while_revalidating(monkeypatch, wait_until):
+    cache = api6_.WeatherCache(ttl=60, max_entries=10, max_stale=600)
+    monkeypatch.setattr(api6_, "weather_cache", cache)
+    key = api6_.cache_key_for("Jakarta")
+    cache.set(key, {"temp": 30}, age=120)
+
+    release = threading.Event()
+    calls = []
+
+    def fake_fetch(city, priority=api6_.PRIORITY_INTERACTIVE):
+        calls.append((city, priority))
+        release.wait(5)
+        return {"temp": 35}
+
+    monkeypatch.setattr(api6_, "fetch_weather_from_owm", fake_fetch)
+
+    # Data lama langsung disajikan; hanya satu refresh background yang berjalan
+    assert api6_.get_weather("Jakarta") == {"temp": 30}
+    assert api6_.get_weather("jakarta") == {"temp": 30}
+    release.set()
+    wait_until(lambda: calls and cache.stats()["refreshing"] == 0)
+
+    assert calls == [(api6_._upstream_query("Jakarta"), api6_.PRIORITY_BACKGROUND)]
+    assert cache.get(key) == ({"temp": 35}, False)